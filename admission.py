@@ -0,0 +1,147 @@
+import io
+import math
+import threading
+import time
+from PIL import Image
+from config import Config
+from utils import get_pdf_page_count
+
+class AdmissionRejected(Exception):
+    """Raised when a document cannot be admitted within the queue budget"""
+    
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class _Lane:
+    def __init__(self, name, capacity, reject_status):
+        self.name = name
+        self.capacity = capacity
+        self.reject_status = reject_status
+        self.in_flight = 0.0
+        self.queued = 0.0
+        self.active = 0
+
+class AdmissionController:
+    """Per-worker admission control using estimated document cost"""
+    
+    def __init__(self, light_capacity=None, heavy_capacity=None, heavy_threshold=None,
+                 queue_timeout=None, seconds_per_page=None, resource_monitor=None):
+        self.heavy_threshold = heavy_threshold or Config.ADMISSION_HEAVY_THRESHOLD
+        self.queue_timeout = queue_timeout if queue_timeout is not None else Config.ADMISSION_QUEUE_TIMEOUT
+        self.seconds_per_page = seconds_per_page or Config.ADMISSION_SECONDS_PER_PAGE
+        # Optional: measured memory per cost unit also gates admission under the worker watermark
+        self.resource_monitor = resource_monitor
+        
+        # Cheap documents must never wait behind heavy ones, so each has its own lane
+        self.lanes = {
+            'light': _Lane('light', light_capacity or Config.ADMISSION_LIGHT_CAPACITY, 503),
+            'heavy': _Lane('heavy', heavy_capacity or Config.ADMISSION_HEAVY_CAPACITY, 429)
+        }
+        self._condition = threading.Condition()
+    
+    def estimate_cost(self, content, file_type, page_count=None):
+        """Estimate processing cost in page units before rasterizing"""
+        if file_type == 'pdf':
+            if page_count is not None:
+                return float(max(1, page_count))
+            try:
+                return float(max(1, get_pdf_page_count(content)))
+            except Exception:
+                # Unreadable structure: fall back to roughly 100KB per page
+                return float(max(1, len(content) // 100000))
+        
+        try:
+            # Image.open only parses the header, pixels are decoded lazily
+            image = Image.open(io.BytesIO(content))
+            width, height = image.size
+            # Oversized photos are decoded down to the OCR pixel budget
+            pixels = min(width * height, Config.OCR_MAX_PIXELS)
+            # Multi-page TIFF/WebP: every (selected) frame is OCR'd
+            frames = page_count if page_count is not None else getattr(image, 'n_frames', 1)
+            return max(1.0, frames * pixels / 4000000)
+        except Exception:
+            return max(1.0, len(content) / 1000000)
+    
+    def acquire(self, cost, deadline=None):
+        """Reserve capacity for a document or raise AdmissionRejected"""
+        lane = self.lanes['heavy'] if cost >= self.heavy_threshold else self.lanes['light']
+        # A single document larger than the lane still runs, just alone
+        cost = min(cost, lane.capacity)
+        
+        with self._condition:
+            if not self._fits(lane, cost):
+                if lane.queued + cost > lane.capacity or self._recycling():
+                    raise self._rejection(lane, cost)
+                
+                lane.queued += cost
+                # Never queue past the request's own deadline
+                queue_timeout = self.queue_timeout
+                if deadline is not None:
+                    queue_timeout = min(queue_timeout, deadline.remaining())
+                
+                wait_until = time.monotonic() + queue_timeout
+                try:
+                    while not self._fits(lane, cost):
+                        remaining = wait_until - time.monotonic()
+                        if remaining <= 0:
+                            raise self._rejection(lane, cost)
+                        self._condition.wait(remaining)
+                finally:
+                    lane.queued -= cost
+            
+            lane.in_flight += cost
+            lane.active += 1
+        
+        return {'lane': lane.name, 'cost': cost}
+    
+    def release(self, ticket):
+        """Return the capacity held by an admitted document"""
+        with self._condition:
+            lane = self.lanes[ticket['lane']]
+            lane.in_flight = max(0.0, lane.in_flight - ticket['cost'])
+            lane.active -= 1
+            self._condition.notify_all()
+    
+    def stats(self):
+        with self._condition:
+            return {
+                name: {
+                    'capacity': lane.capacity,
+                    'in_flight_cost': lane.in_flight,
+                    'queued_cost': lane.queued,
+                    'active_requests': lane.active
+                }
+                for name, lane in self.lanes.items()
+            }
+    
+    def _recycling(self):
+        return self.resource_monitor is not None and self.resource_monitor.recycle_requested
+    
+    def _fits(self, lane, cost):
+        if lane.in_flight + cost > lane.capacity:
+            return False
+        if self.resource_monitor is None:
+            return True
+        in_flight = sum(other.in_flight for other in self.lanes.values())
+        # An idle worker always takes one document, unless it is about to be recycled
+        if not in_flight and not self._recycling():
+            return True
+        return self.resource_monitor.admits(cost, in_flight)
+    
+    def _rejection(self, lane, cost):
+        backlog = lane.in_flight + lane.queued
+        retry_after = max(1, math.ceil(backlog * self.seconds_per_page / lane.capacity))
+        if lane.in_flight + cost <= lane.capacity:
+            # The lane has room, so memory is what is full
+            return AdmissionRejected(
+                "Server busy: worker memory is near its limit",
+                503,
+                retry_after
+            )
+        return AdmissionRejected(
+            f"Server busy: {lane.name} document lane is at capacity",
+            lane.reject_status,
+            retry_after
+        )
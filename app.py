@@ -1,10 +1,72 @@
-from flask import Flask, request, jsonify
-from utils import download_file, extract_text_from_document
+import hmac
+import json
+from contextlib import nullcontext
+from flask import Flask, Response, request, jsonify, stream_with_context, abort, g
+from utils import (
+    fetch_document, detect_file_type, extract_text_from_document, iter_document_pages,
+    get_document_page_count, parse_page_selection, PageSelectionError, ocr_settings
+)
 from bill_processor import BillProcessor
+from admission import AdmissionController, AdmissionRejected
+from deadline import Deadline, DeadlineExceeded
+from result_cache import ResultCache
+from profiling import RequestProfiler
+from traffic_capture import TrafficRecorder
+from resource_monitor import resource_monitor
+from extraction_store import create_extraction_store
+from reprocess import ReprocessJobs
+from structured_logging import get_logger, start_request, current_request_id, current_stage_timings, dropped_log_count
 from config import Config
 
 app = Flask(__name__)
 bill_processor = BillProcessor()
+admission_controller = AdmissionController(resource_monitor=resource_monitor)
+result_cache = ResultCache()
+request_profiler = RequestProfiler()
+traffic_recorder = TrafficRecorder()
+extraction_store = create_extraction_store(Config.EXTRACTION_STORE_URL) if Config.EXTRACTION_STORE_URL else None
+reprocess_jobs = ReprocessJobs(Config.EXTRACTION_STORE_URL) if extraction_store else None
+logger = get_logger('app')
+
+@app.before_request
+def bind_request_id():
+    start_request(request.headers.get('X-Request-ID'))
+    g.resources = resource_monitor.start_request()
+    g.capture = request.endpoint == 'extract_bill_data' and traffic_recorder.should_capture()
+
+@app.after_request
+def log_request(response):
+    """Echo the request id and log one summary record once the body (or stream) is sent"""
+    request_id = current_request_id()
+    timings = current_stage_timings()
+    resources = g.resources
+    response.headers['X-Request-ID'] = request_id
+    method, path, status = request.method, request.path, response.status_code
+    capture = g.get('capture') and (request.get_json(silent=True), g.get('captured_document', (None, None, None)))
+    
+    def log_summary():
+        duration_ms = timings.elapsed_ms()
+        resource_monitor.finish_request(resources)
+        # Slow and failed requests are always kept; fast successes are sampled
+        sampled = status < 400 and duration_ms < Config.LOG_SLOW_REQUEST_SECONDS * 1000
+        logger.info("request complete", extra={
+            'fields': {
+                'method': method,
+                'path': path,
+                'status': status,
+                'duration_ms': duration_ms,
+                'stages_ms': timings.to_dict(),
+                'memory': resources.to_dict()
+            },
+            'request_id': request_id,
+            'sampled': sampled
+        })
+        if capture:
+            payload, (document_content, file_type, content_hash) = capture
+            traffic_recorder.record(payload, request_id, status, duration_ms, document_content, file_type, content_hash)
+    
+    response.call_on_close(log_summary)
+    return response
 
 @app.route('/extract-bill-data', methods=['POST'])
 def extract_bill_data():
@@ -25,37 +87,121 @@ def extract_bill_data():
             }), 400
         
         document_url = data['document']
+        deadline = Deadline.from_request(data, request.headers)
+        profiled = request_profiler.should_profile(request.headers)
+        layout_mode = bool(data.get('layout_mode', Config.OCR_LAYOUT_MODE))
+        stream = _wants_stream(data)
         
-        # Download and process document
-        document_content = download_file(document_url)
-        pages_data = extract_text_from_document(document_content)
+        # Streams and profiled runs are never cached; clients can also opt out with "cache": false
+        cache_key = None
+        if Config.RESULT_CACHE_ENABLED and not stream and not profiled and data.get('cache', True):
+            cache_key = ResultCache.make_key(document_url, layout_mode=layout_mode, pages=data.get('pages'))
+        cached = result_cache.get(cache_key) if cache_key else None
         
-        # Check if we got any text
-        all_text = " ".join([page['text'] for page in pages_data])
-        if not all_text.strip():
-            return jsonify({
-                "is_success": False,
-                "error": "No text could be extracted from the document",
-                "token_usage": {
-                    "total_tokens": 0,
-                    "input_tokens": 0,
-                    "output_tokens": 0
-                }
-            }), 400
+        # Download (or revalidate) and process document
+        fetched = fetch_document(
+            document_url, deadline,
+            etag=cached['etag'] if cached else None,
+            last_modified=cached['last_modified'] if cached else None
+        )
+        document_content = fetched['content']
+        # A 304 has no body; the cached entry still knows what the document was
+        file_type = detect_file_type(document_content) if document_content is not None else cached.get('file_type')
+        if g.capture:
+            # Recorded before the cache branch so cache-served captures keep their document reference
+            g.captured_document = (document_content, file_type, cached['content_hash'] if document_content is None else None)
         
-        # Process bill data with LLM enhancement
-        extracted_data, token_usage = bill_processor.extract_bill_data(pages_data)
+        if cached:
+            # 304, or an origin without validators that served identical bytes
+            if fetched['not_modified'] or ResultCache.content_hash(document_content) == cached['content_hash']:
+                result_cache.revalidated(cache_key, fetched['etag'], fetched['last_modified'])
+                return jsonify(dict(cached['result'], cached=True)), 200
+        if cache_key:
+            result_cache.record_miss()
         
-        # Prepare success response
-        response = {
-            "is_success": True,
-            "token_usage": token_usage,
-            "data": extracted_data
-        }
+        # Preflight: page count from the file structure, then the requested pages
+        page_count = get_document_page_count(document_content, file_type)
+        pages = parse_page_selection(data.get('pages'), page_count) or list(range(1, page_count + 1))
+        
+        # Admit based on estimated cost before anything is rasterized
+        cost = admission_controller.estimate_cost(document_content, file_type, len(pages))
+        ticket = admission_controller.acquire(cost, deadline)
+        # Released here unless a stream has taken the ticket over, so setup failures never leak it
+        released_on_close = False
+        try:
+            g.resources.cost = ticket['cost']
+            profile = request_profiler.maybe_profile(
+                current_request_id(), profiled, file_type=file_type, page_count=page_count, pages=len(pages)
+            )
+            if stream:
+                response = _stream_bill_data(
+                    document_content, deadline, layout_mode, pages, page_count, profile, source=document_url
+                )
+                response.call_on_close(lambda: admission_controller.release(ticket))
+                released_on_close = True
+                if profiled:
+                    response.headers['X-Profile-Id'] = current_request_id()
+                return response
+            
+            with profile:
+                result, status = _extract_bill_result(
+                    document_content, deadline, layout_mode, pages, page_count, source=document_url
+                )
+        finally:
+            if not released_on_close:
+                admission_controller.release(ticket)
         
-        return jsonify(response), 200
+        # Partial results must not be served to later requests
+        if cache_key and status == 200 and not result['is_partial']:
+            result_cache.put(
+                cache_key, result, ResultCache.content_hash(document_content),
+                fetched['etag'], fetched['last_modified'], file_type
+            )
         
+        response = jsonify(result)
+        if profiled:
+            response.headers['X-Profile-Id'] = current_request_id()
+        return response, status
+        
+    except PageSelectionError as e:
+        return jsonify({
+            "is_success": False,
+            "error": str(e),
+            "token_usage": {
+                "total_tokens": 0,
+                "input_tokens": 0,
+                "output_tokens": 0
+            }
+        }), 400
+    
+    except AdmissionRejected as e:
+        logger.warning("request rejected by admission control", extra={'fields': {'error': str(e)}})
+        response = jsonify({
+            "is_success": False,
+            "error": str(e),
+            "token_usage": {
+                "total_tokens": 0,
+                "input_tokens": 0,
+                "output_tokens": 0
+            }
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status_code
+    
+    except DeadlineExceeded as e:
+        logger.warning("request deadline exceeded", extra={'fields': {'error': str(e)}})
+        return jsonify({
+            "is_success": False,
+            "error": str(e),
+            "token_usage": {
+                "total_tokens": 0,
+                "input_tokens": 0,
+                "output_tokens": 0
+            }
+        }), 504
+    
     except Exception as e:
+        logger.error("extraction failed", exc_info=True)
         return jsonify({
             "is_success": False,
             "error": str(e),
@@ -66,12 +212,204 @@ def extract_bill_data():
             }
         }), 500
 
+def _extract_bill_result(document_content, deadline, layout_mode=False, pages=None, page_count=None, source=None):
+    """Run the full pipeline and build the response body and status"""
+    pages_data = extract_text_from_document(document_content, deadline, layout_mode, pages)
+    
+    # Check if we got any text
+    all_text = " ".join([page['text'] for page in pages_data])
+    if not all_text.strip():
+        if deadline.is_partial:
+            raise DeadlineExceeded("Request deadline expired before any page completed")
+        return {
+            "is_success": False,
+            "error": "No text could be extracted from the document",
+            "token_usage": {
+                "total_tokens": 0,
+                "input_tokens": 0,
+                "output_tokens": 0
+            }
+        }, 400
+    
+    # Process bill data with LLM enhancement
+    extracted_data, token_usage = bill_processor.extract_bill_data(pages_data, deadline)
+    
+    # Prepare success response
+    response = {
+        "is_success": True,
+        "is_partial": deadline.is_partial,
+        "token_usage": token_usage,
+        "data": extracted_data
+    }
+    if deadline.is_partial:
+        response["deadline"] = deadline.to_dict()
+    response["page_count"] = page_count
+    
+    if not deadline.is_partial:
+        _store_extraction(document_content, layout_mode, pages, pages_data, response, source)
+    
+    return response, 200
+
+def _store_extraction(document_content, layout_mode, pages, pages_data, response, source=None):
+    """Complete results keep their OCR text, so parser changes can be applied without re-OCR"""
+    if not extraction_store:
+        return
+    try:
+        extraction_store.save(
+            ResultCache.content_hash(document_content), ocr_settings(layout_mode, pages), pages_data,
+            bill_processor.PARSER_VERSION, response,
+            source=source if source and source.startswith(('http://', 'https://')) else None
+        )
+    except Exception:
+        logger.warning("storing extraction failed", exc_info=True)
+
+def _wants_stream(data):
+    """Streaming is requested via the body flag or an NDJSON Accept header"""
+    if data.get('stream') is True:
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def _stream_bill_data(document_content, deadline, layout_mode=False, pages=None, page_count=None, profile=None, source=None):
+    """Emit one NDJSON record per finished page, then a summary record"""
+    pages_data = []
+    pagewise_items = []
+    
+    def collect_pages():
+        for page in iter_document_pages(document_content, deadline, layout_mode, pages):
+            pages_data.append(page)
+            yield page
+    
+    def generate():
+        try:
+            # While suspended at a yield the profile also sees the server writing the record
+            with profile or nullcontext():
+                summary = None
+                for record in bill_processor.stream_bill_data(collect_pages(), deadline):
+                    if record['type'] == 'page':
+                        pagewise_items.append(record['page'])
+                    else:
+                        summary = record
+                        record['page_count'] = page_count
+                        if deadline.is_partial:
+                            record['deadline'] = deadline.to_dict()
+                    yield json.dumps(record) + "\n"
+                
+                # Stored in the same shape as a non-streamed response, once the client has the summary
+                if summary and not deadline.is_partial:
+                    response = {
+                        "is_success": True,
+                        "is_partial": False,
+                        "token_usage": summary['token_usage'],
+                        "data": dict(summary['data'], pagewise_line_items=pagewise_items),
+                        "page_count": page_count
+                    }
+                    _store_extraction(document_content, layout_mode, pages, pages_data, response, source)
+        except Exception as e:
+            logger.error("streamed extraction failed", exc_info=True)
+            yield json.dumps({
+                "type": "error",
+                "is_success": False,
+                "error": str(e),
+                "token_usage": {
+                    "total_tokens": 0,
+                    "input_tokens": 0,
+                    "output_tokens": 0
+                }
+            }) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _supplied_token(header):
+    """Token from the given header, or from an Authorization: Bearer header"""
+    supplied = request.headers.get(header, '')
+    if not supplied and request.headers.get('Authorization', '').startswith('Bearer '):
+        supplied = request.headers['Authorization'][len('Bearer '):]
+    return supplied
+
+def _require_profile_access():
+    """Profiles are hidden unless PROFILE_TOKEN is set and the caller presents it"""
+    if not request_profiler.enabled:
+        abort(404)
+    if not request_profiler.authorized(_supplied_token('X-Profile-Token')):
+        abort(401)
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    _require_profile_access()
+    return jsonify({"profiles": request_profiler.list()}), 200
+
+@app.route('/profiles/<request_id>', methods=['GET'])
+def get_profile(request_id):
+    """Text report by default; ?format=pstats returns the raw stats for snakeviz/pstats"""
+    _require_profile_access()
+    profile = request_profiler.get(request_id)
+    if profile is None:
+        abort(404)
+    
+    if request.args.get('format') == 'pstats':
+        return Response(
+            profile['raw'], mimetype='application/octet-stream',
+            headers={'Content-Disposition': f'attachment; filename="{request_id}.pstats"'}
+        )
+    return Response(profile['report'], mimetype='text/plain')
+
+def _require_reprocess_access():
+    """Reprocessing is hidden unless a store and REPROCESS_TOKEN are set and the caller presents the token"""
+    if not reprocess_jobs or not Config.REPROCESS_TOKEN:
+        abort(404)
+    supplied = _supplied_token('X-Reprocess-Token')
+    if not supplied or not hmac.compare_digest(supplied, Config.REPROCESS_TOKEN):
+        abort(401)
+
+@app.route('/reprocess', methods=['POST'])
+def reprocess():
+    """Queue a batch of stored extractions from older parser versions; poll the job, then call again while 'remaining' > 0"""
+    _require_reprocess_access()
+    
+    data = request.get_json(silent=True) or {}
+    keys = data.get('document_keys')
+    if keys is not None and not isinstance(keys, list):
+        return jsonify({"is_success": False, "error": "'document_keys' must be a list"}), 400
+    try:
+        limit = min(int(data.get('limit', Config.REPROCESS_BATCH_SIZE)), Config.REPROCESS_BATCH_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({"is_success": False, "error": "'limit' must be an integer"}), 400
+    
+    # The batch runs on one background thread, so request threads never wait on the process pool
+    job, created = reprocess_jobs.submit(
+        keys[:limit] if keys is not None else None, force=bool(data.get('force', False)), limit=limit
+    )
+    response = jsonify(dict(job, is_success=created))
+    response.headers['Location'] = f"/reprocess/{job['job_id']}"
+    return response, 202 if created else 409
+
+@app.route('/reprocess/<job_id>', methods=['GET'])
+def reprocess_status(job_id):
+    _require_reprocess_access()
+    job = reprocess_jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(dict(job, is_success=job['status'] != 'failed' and not (job['summary'] or {}).get('failed'))), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-worker memory accounting, admission and cache state"""
+    return jsonify({
+        "memory": resource_monitor.metrics(),
+        "admission": admission_controller.stats(),
+        "result_cache": result_cache.stats()
+    }), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         "status": "healthy", 
         "message": "Bill Extraction API with Free LLM Enhancement",
-        "version": "2.0"
+        "version": "2.0",
+        "admission": admission_controller.stats(),
+        "result_cache": result_cache.stats(),
+        "dropped_log_records": dropped_log_count(),
+        "dropped_captures": traffic_recorder.dropped
     }), 200
 
 @app.route('/')
@@ -80,7 +418,12 @@ def home():
         "message": "Bill Extraction API with Free LLM",
         "endpoint": "POST /extract-bill-data",
         "example_request": {
-            "document": "https://example.com/your-bill.jpg"
+            "document": "https://example.com/your-bill.jpg",
+            "stream": False,
+            "deadline_seconds": Config.REQUEST_DEADLINE_SECONDS,
+            "layout_mode": Config.OCR_LAYOUT_MODE,
+            "cache": True,
+            "pages": "1-3,7"
         }
     }), 200
 
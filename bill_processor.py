@@ -1,37 +1,104 @@
 import re
 from rule_based_parser import RuleBasedBillParser
 from llm_enhancer import LLMEnhancer
+from deadline import DeadlineExceeded
+from structured_logging import get_logger, stage_timer
+
+logger = get_logger('bill_processor')
 
 class BillProcessor:
+    # Results stored under another version are re-parsed by reprocess.py
+    PARSER_VERSION = f"rules-{RuleBasedBillParser.VERSION}.enhancer-{LLMEnhancer.VERSION}"
+    
     def __init__(self):
         self.rule_parser = RuleBasedBillParser()
-        self.llm_enhancer = LLMEnhancer()
         
-    def extract_bill_data(self, pages_data):
+    def extract_bill_data(self, pages_data, deadline=None):
         """Extract bill data with enhancement"""
+        # One enhancer per call: its token counts are per-request state, and requests run concurrently
+        llm_enhancer = LLMEnhancer()
         try:
             # Step 1: Rule-based parsing
-            extracted_data = self.rule_parser.parse_bill_text(pages_data)
+            with stage_timer(logger, 'parse'):
+                extracted_data = self.rule_parser.parse_bill_text(pages_data)
             
-            # Step 2: Enhancement
+            # Step 2: Enhancement, skipped when the request budget is spent
             combined_text = " ".join([page['text'] for page in pages_data])
-            extracted_data = self.llm_enhancer.enhance_extraction(combined_text, extracted_data)
+            if deadline and deadline.expired():
+                deadline.mark_truncated('enhancement')
+            else:
+                with stage_timer(logger, 'enhance'):
+                    extracted_data = llm_enhancer.enhance_extraction(combined_text, extracted_data)
             
             # Step 3: Final validation
             extracted_data = self._clean_and_validate_data(extracted_data)
             
-            # Calculate token usage
-            token_usage = {
-                "total_tokens": self.llm_enhancer.get_token_count(),
-                "input_tokens": self.llm_enhancer.get_input_tokens(),
-                "output_tokens": self.llm_enhancer.get_output_tokens()
-            }
+            return extracted_data, self._token_usage(llm_enhancer)
+            
+        except Exception as e:
+            raise Exception(f"Bill processing failed: {str(e)}")
+    
+    def stream_bill_data(self, pages_iter, deadline=None):
+        """Yield each page as soon as it is parsed, then a document summary"""
+        llm_enhancer = LLMEnhancer()
+        try:
+            pages_text = []
+            pagewise_items = []
             
-            return extracted_data, token_usage
+            # Step 1 + 2 per page: rule-based parsing and categorization
+            for page in pages_iter:
+                with stage_timer(logger, 'parse', page_no=page.get('page_no')):
+                    page_data = self.rule_parser.parse_page(page)
+                if deadline and deadline.expired():
+                    deadline.mark_truncated('enhancement')
+                else:
+                    with stage_timer(logger, 'enhance', page_no=page.get('page_no')):
+                        page_data = llm_enhancer.enhance_page(page['text'], page_data)
+                
+                pages_text.append(page['text'])
+                pagewise_items.append(page_data)
+                yield {'type': 'page', 'page': page_data}
             
+            combined_text = " ".join(pages_text)
+            if not combined_text.strip():
+                if deadline and deadline.is_partial:
+                    raise DeadlineExceeded("Request deadline expired before any page completed")
+                raise Exception("No text could be extracted from the document")
+            
+            # Step 3: Document-level validation once every page is in
+            extracted_data = {'pagewise_line_items': pagewise_items}
+            if deadline and deadline.expired():
+                deadline.mark_truncated('enhancement')
+            else:
+                with stage_timer(logger, 'validate'):
+                    extracted_data = llm_enhancer.validate_extraction(combined_text, extracted_data)
+            extracted_data = self._clean_and_validate_data(extracted_data)
+            
+            summary = {
+                key: value for key, value in extracted_data.items()
+                if key != 'pagewise_line_items'
+            }
+            yield {
+                'type': 'summary',
+                'is_success': True,
+                'is_partial': bool(deadline and deadline.is_partial),
+                'token_usage': self._token_usage(llm_enhancer),
+                'data': summary
+            }
+            
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Bill processing failed: {str(e)}")
     
+    def _token_usage(self, llm_enhancer):
+        """Calculate token usage"""
+        return {
+            "total_tokens": llm_enhancer.get_token_count(),
+            "input_tokens": llm_enhancer.get_input_tokens(),
+            "output_tokens": llm_enhancer.get_output_tokens()
+        }
+    
     def _clean_and_validate_data(self, data):
         """Clean and validate extracted data"""
         total_items = 0
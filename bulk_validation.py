@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Vectorized total validation across many stored extractions, for nightly audits
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from llm_enhancer import LLMEnhancer
+from extraction_store import create_extraction_store
+from config import Config
+
+CONFIDENCE_LEVELS = np.array(['low', 'medium', 'high'])
+
+def load_columns(documents, find_totals=None):
+    """Flatten (data, text) pairs into item amounts and stated totals, each with a document index column"""
+    find_totals = find_totals or LLMEnhancer()._find_totals
+    item_amounts, item_document = [], []
+    total_amounts, total_document = [], []
+    
+    count = 0
+    for index, (data, text) in enumerate(documents):
+        count += 1
+        for page in data.get('pagewise_line_items', []):
+            for item in page.get('bill_items', []):
+                item_amounts.append(item['item_amount'])
+                item_document.append(index)
+        # Same candidates as the per-request path: every amount after a total keyword
+        for match in find_totals(text):
+            total_amounts.append(float(match.replace(',', '')))
+            total_document.append(index)
+    
+    return {
+        'documents': count,
+        'item_amounts': np.array(item_amounts, dtype=np.float64),
+        'item_document': np.array(item_document, dtype=np.int64),
+        'total_amounts': np.array(total_amounts, dtype=np.float64),
+        'total_document': np.array(total_document, dtype=np.int64)
+    }
+
+def validate_columns(columns, min_difference=None, iqr_multiplier=None):
+    """Per-document totals, accuracy, confidence bands and outlier flags as arrays"""
+    min_difference = min_difference if min_difference is not None else Config.VALIDATION_OUTLIER_MIN_DIFFERENCE
+    iqr_multiplier = iqr_multiplier if iqr_multiplier is not None else Config.VALIDATION_OUTLIER_IQR_MULTIPLIER
+    count = columns['documents']
+    
+    # bincount adds in input order, like the per-request sum() over pages and items
+    extracted = np.bincount(columns['item_document'], weights=columns['item_amounts'], minlength=count)
+    items = np.bincount(columns['item_document'], minlength=count)
+    
+    # The largest amount after a total keyword is taken as the stated total; NaN where none was found
+    stated = np.full(count, np.nan)
+    np.fmax.at(stated, columns['total_document'], columns['total_amounts'])
+    has_total = ~np.isnan(stated)
+    positive = has_total & (stated > 0)
+    
+    difference = np.abs(extracted - stated)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(positive, difference / stated, np.nan)
+    accuracy = np.where(positive, 1 - relative, np.where(has_total, 0.0, np.nan))
+    confidence = CONFIDENCE_LEVELS[(accuracy > 0.9).astype(np.int64) + (accuracy > 0.7)]
+    
+    # Outliers: relative differences past the batch's upper fence, never below min_difference
+    fence = min_difference
+    if positive.any():
+        q1, q3 = np.percentile(relative[positive], [25, 75])
+        fence = max(min_difference, q3 + iqr_multiplier * (q3 - q1))
+    outlier = positive & (relative > fence)
+    # Items with nothing to check them against, or a total with no items behind it
+    unverified = ~has_total & (items > 0)
+    empty = positive & (items == 0)
+    
+    return {
+        'documents': count,
+        'item_count': items,
+        'extracted_total': extracted,
+        'validated_total': stated,
+        'has_total': has_total,
+        'difference': difference,
+        'relative_difference': relative,
+        'accuracy': accuracy,
+        'confidence': confidence,
+        'outlier': outlier | empty,
+        'unverified': unverified,
+        'outlier_fence': fence
+    }
+
+def llm_validation_fields(validation, index):
+    """The llm_validation dict the per-request path would attach, or None where it attaches none"""
+    if not validation['has_total'][index]:
+        return None
+    accuracy = float(validation['accuracy'][index])
+    return {
+        'extracted_total': float(validation['extracted_total'][index]),
+        'validated_total': float(validation['validated_total'][index]),
+        'accuracy_score': round(accuracy * 100, 2),
+        'confidence': str(validation['confidence'][index])
+    }
+
+def summarize(validation):
+    has_total = validation['has_total']
+    confidence = validation['confidence'][has_total]
+    return {
+        'documents': validation['documents'],
+        'with_stated_total': int(has_total.sum()),
+        'confidence': {level: int((confidence == level).sum()) for level in ('high', 'medium', 'low')},
+        'mean_accuracy_score': round(float(np.mean(validation['accuracy'][has_total])) * 100, 2) if has_total.any() else None,
+        'outliers': int(validation['outlier'].sum()),
+        'unverified': int(validation['unverified'].sum()),
+        'outlier_fence': round(float(validation['outlier_fence']), 4)
+    }
+
+def compare_with_per_request(documents, validation, tolerance=1e-9):
+    """Run LLMEnhancer's per-document validation and count fields that differ from the bulk result"""
+    enhancer = LLMEnhancer()
+    mismatches = []
+    started = time.perf_counter()
+    for index, (data, text) in enumerate(documents):
+        expected = enhancer._validate_with_patterns(text, {'pagewise_line_items': data.get('pagewise_line_items', [])})
+        expected = expected.get('llm_validation')
+        actual = llm_validation_fields(validation, index)
+        if expected is None or actual is None:
+            same = expected is actual
+        else:
+            # Summation order can differ from sum() in the last bit (Python 3.12+ compensates)
+            same = (
+                abs(expected['extracted_total'] - actual['extracted_total']) <= tolerance * max(1.0, abs(expected['extracted_total']))
+                and all(expected[field] == actual[field] for field in ('validated_total', 'accuracy_score', 'confidence'))
+            )
+        if not same:
+            mismatches.append((index, expected, actual))
+    return mismatches, time.perf_counter() - started
+
+def iter_store_documents(store, limit=None):
+    """(key, data, text) from an ExtractionStore, with the same combined text the pipeline validates"""
+    for key, pages, result in store.iter_entries(limit):
+        yield key, result.get('data') or {}, " ".join(page['text'] for page in pages)
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate stored extractions in bulk and flag outliers")
+    parser.add_argument('--store', default=Config.EXTRACTION_STORE_URL, help="Store URL (default: EXTRACTION_STORE_URL)")
+    parser.add_argument('--limit', type=int, help="At most this many documents")
+    parser.add_argument('--compare', action='store_true', help="Also run the per-request validation and check it matches")
+    parser.add_argument('--output', help="Write flagged documents (outliers and unverified) as JSONL")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("No store configured; pass --store sqlite:///path.db or set EXTRACTION_STORE_URL")
+    
+    print("🧮 BULK VALIDATION")
+    print("=" * 60)
+    
+    started = time.perf_counter()
+    keys, documents = [], []
+    for key, data, text in iter_store_documents(create_extraction_store(args.store), args.limit):
+        keys.append(key)
+        documents.append((data, text))
+    columns = load_columns(documents)
+    loaded = time.perf_counter()
+    validation = validate_columns(columns)
+    validated = time.perf_counter()
+    
+    summary = summarize(validation)
+    print(f"📄 {summary['documents']} documents, {len(columns['item_amounts'])} items, {summary['with_stated_total']} with a stated total")
+    print(f"⏱️ Load + total search {loaded - started:.2f}s | vectorized validation {(validated - loaded) * 1000:.1f} ms")
+    print(f"📊 Confidence: {summary['confidence']} | mean accuracy {summary['mean_accuracy_score']}%")
+    print(f"🚩 Outliers: {summary['outliers']} (relative difference > {summary['outlier_fence']}) | unverified: {summary['unverified']}")
+    
+    if args.compare:
+        mismatches, seconds = compare_with_per_request(documents, validation)
+        print(f"🔁 Per-request path: {seconds:.2f}s, {len(mismatches)} mismatching documents")
+        for index, expected, actual in mismatches[:10]:
+            print(f"   ❌ {keys[index]}: {expected} != {actual}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            for index in np.flatnonzero(validation['outlier'] | validation['unverified']):
+                f.write(json.dumps({
+                    'document_key': keys[index],
+                    'llm_validation': llm_validation_fields(validation, index),
+                    'item_count': int(validation['item_count'][index]),
+                    'outlier': bool(validation['outlier'][index]),
+                    'unverified': bool(validation['unverified'][index])
+                }) + "\n")
+    
+    if args.compare and mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,4 +3,90 @@ import os
 class Config:
     HOST = '0.0.0.0'
     PORT = int(os.environ.get('PORT', 5000))
-    DEBUG = False
\ No newline at end of file
+    DEBUG = False
+    
+    # Admission control per worker process, so it needs threaded workers (gthread); cost units are roughly one OCR'd page
+    ADMISSION_LIGHT_CAPACITY = float(os.environ.get('ADMISSION_LIGHT_CAPACITY', 8))
+    ADMISSION_HEAVY_CAPACITY = float(os.environ.get('ADMISSION_HEAVY_CAPACITY', 20))
+    ADMISSION_HEAVY_THRESHOLD = float(os.environ.get('ADMISSION_HEAVY_THRESHOLD', 10))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 5))
+    ADMISSION_SECONDS_PER_PAGE = float(os.environ.get('ADMISSION_SECONDS_PER_PAGE', 3))
+    
+    # Request deadline; keep the default below the gunicorn worker timeout
+    REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 25))
+    REQUEST_DEADLINE_MAX_SECONDS = float(os.environ.get('REQUEST_DEADLINE_MAX_SECONDS', 120))
+    DEADLINE_MIN_PAGE_SECONDS = float(os.environ.get('DEADLINE_MIN_PAGE_SECONDS', 1))
+    
+    # OCR scheduling; WEB_CONCURRENCY is the gunicorn worker count
+    OCR_WORKER_PROCESSES = int(os.environ.get('WEB_CONCURRENCY', 1))
+    OCR_MAX_PAGE_CONCURRENCY = int(os.environ.get('OCR_MAX_PAGE_CONCURRENCY', 4))
+    OCR_MAX_TESSERACT_THREADS = int(os.environ.get('OCR_MAX_TESSERACT_THREADS', 4))
+    
+    # OCR only the detected item/totals regions instead of the whole page
+    OCR_LAYOUT_MODE = os.environ.get('OCR_LAYOUT_MODE', 'false').lower() == 'true'
+    
+    # Reuse OCR text for near-exact page copies within one document: the nearest hashes (at most
+    # MAX_CANDIDATES) are compared by the largest gray difference of their 400px thumbnails
+    PAGE_DEDUP_ENABLED = os.environ.get('PAGE_DEDUP_ENABLED', 'true').lower() == 'true'
+    PAGE_DEDUP_MAX_HASH_DISTANCE = int(os.environ.get('PAGE_DEDUP_MAX_HASH_DISTANCE', 10))
+    PAGE_DEDUP_MAX_DIFFERENCE = int(os.environ.get('PAGE_DEDUP_MAX_DIFFERENCE', 32))
+    PAGE_DEDUP_MAX_CANDIDATES = int(os.environ.get('PAGE_DEDUP_MAX_CANDIDATES', 4))
+    
+    # Decode oversized photos at reduced scale; the short side floor keeps OCR DPI usable
+    OCR_MAX_PIXELS = int(os.environ.get('OCR_MAX_PIXELS', 8000000))
+    OCR_MIN_SHORT_SIDE = int(os.environ.get('OCR_MIN_SHORT_SIDE', 1600))
+    
+    # Opt-in orientation detection on a downsampled copy before the full OCR pass (one extra tesseract run per page)
+    OCR_AUTO_ROTATE = os.environ.get('OCR_AUTO_ROTATE', 'false').lower() == 'true'
+    OCR_OSD_MAX_SIDE = int(os.environ.get('OCR_OSD_MAX_SIDE', 1200))
+    OCR_OSD_MIN_CONFIDENCE = float(os.environ.get('OCR_OSD_MIN_CONFIDENCE', 2.0))
+    
+    # Per-worker cache of final results keyed by document URL
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_TTL_SECONDS = float(os.environ.get('RESULT_CACHE_TTL_SECONDS', 3600))
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 512))
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    
+    # Page-level OCR queue: '' runs OCR in the web process, or memory:// / sqlite:///path.db (one host, local disk)
+    PAGE_QUEUE_URL = os.environ.get('PAGE_QUEUE_URL', '')
+    PAGE_QUEUE_LOCAL_WORKERS = int(os.environ.get('PAGE_QUEUE_LOCAL_WORKERS', 2))
+    PAGE_QUEUE_LEASE_SECONDS = float(os.environ.get('PAGE_QUEUE_LEASE_SECONDS', 120))
+    PAGE_QUEUE_MAX_ATTEMPTS = int(os.environ.get('PAGE_QUEUE_MAX_ATTEMPTS', 2))
+    PAGE_QUEUE_POLL_INTERVAL = float(os.environ.get('PAGE_QUEUE_POLL_INTERVAL', 0.2))
+    PAGE_QUEUE_JOB_TTL_SECONDS = float(os.environ.get('PAGE_QUEUE_JOB_TTL_SECONDS', 600))
+    
+    # Structured logging: JSON lines from a queue-fed writer thread; success records are sampled
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_SUCCESS_SAMPLE_RATE = float(os.environ.get('LOG_SUCCESS_SAMPLE_RATE', 0.1))
+    LOG_SLOW_REQUEST_SECONDS = float(os.environ.get('LOG_SLOW_REQUEST_SECONDS', 10))
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    
+    # On-demand profiling: X-Profile: <token> or a sampled fraction; '' token disables it
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+    PROFILE_MAX_STORED = int(os.environ.get('PROFILE_MAX_STORED', 50))
+    PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', 40))
+    
+    # Traffic capture for replay_load.py; documents are saved by content hash next to the JSONL
+    CAPTURE_ENABLED = os.environ.get('CAPTURE_ENABLED', 'false').lower() == 'true'
+    CAPTURE_FILE = os.environ.get('CAPTURE_FILE', 'captured_requests.jsonl')
+    CAPTURE_DOCUMENTS_DIR = os.environ.get('CAPTURE_DOCUMENTS_DIR', 'captured_documents')
+    CAPTURE_SAMPLE_RATE = float(os.environ.get('CAPTURE_SAMPLE_RATE', 1.0))
+    
+    # Line-item and total parsing: 'linear' tokenizer, or the original 'regex' patterns with a line length cap
+    LINE_PARSER_MODE = os.environ.get('LINE_PARSER_MODE', 'linear')
+    LINE_PARSER_MAX_LINE_LENGTH = int(os.environ.get('LINE_PARSER_MAX_LINE_LENGTH', 300))
+    
+    # Worker memory: RSS above the watermark (MB) recycles the worker after in-flight requests; 0 disables
+    WORKER_MEMORY_WATERMARK_MB = float(os.environ.get('WORKER_MEMORY_WATERMARK_MB', 0))
+    RESOURCE_SAMPLE_INTERVAL = float(os.environ.get('RESOURCE_SAMPLE_INTERVAL', 0.05))
+    
+    # Stored OCR text and results for reprocess.py; '' disables, or sqlite:///path.db
+    EXTRACTION_STORE_URL = os.environ.get('EXTRACTION_STORE_URL', '')
+    REPROCESS_TOKEN = os.environ.get('REPROCESS_TOKEN', '')
+    REPROCESS_WORKERS = int(os.environ.get('REPROCESS_WORKERS', 2))
+    REPROCESS_BATCH_SIZE = int(os.environ.get('REPROCESS_BATCH_SIZE', 100))
+    
+    # Bulk validation: relative total difference beyond max(this, Q3 + k * IQR) is flagged as an outlier
+    VALIDATION_OUTLIER_MIN_DIFFERENCE = float(os.environ.get('VALIDATION_OUTLIER_MIN_DIFFERENCE', 0.3))
+    VALIDATION_OUTLIER_IQR_MULTIPLIER = float(os.environ.get('VALIDATION_OUTLIER_IQR_MULTIPLIER', 3.0))
\ No newline at end of file
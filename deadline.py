@@ -0,0 +1,61 @@
+import math
+import time
+from config import Config
+
+class DeadlineExceeded(Exception):
+    """Raised when the request budget runs out before any result exists"""
+
+class Deadline:
+    """Request time budget shared by every pipeline stage"""
+    
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.truncated_stages = []
+    
+    @classmethod
+    def from_request(cls, data, headers):
+        """Use the client's budget if given, capped by the configured maximum"""
+        value = data.get('deadline_seconds', headers.get('X-Request-Deadline'))
+        try:
+            seconds = float(value) if value is not None else Config.REQUEST_DEADLINE_SECONDS
+        except (TypeError, ValueError):
+            seconds = Config.REQUEST_DEADLINE_SECONDS
+        # "nan" would slip through min/max below and expire at once; "inf" is no budget either
+        if not math.isfinite(seconds):
+            seconds = Config.REQUEST_DEADLINE_SECONDS
+        
+        return cls(min(max(seconds, 1.0), Config.REQUEST_DEADLINE_MAX_SECONDS))
+    
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def expired(self):
+        return self.remaining() <= 0
+    
+    def can_start(self, min_seconds=None):
+        """Whether there is enough budget left to launch another unit of work"""
+        if min_seconds is None:
+            min_seconds = Config.DEADLINE_MIN_PAGE_SECONDS
+        return self.remaining() > min_seconds
+    
+    def timeout(self, cap=None):
+        """Remaining budget, optionally capped, for stages with their own timeout"""
+        remaining = self.remaining()
+        return min(cap, remaining) if cap is not None else remaining
+    
+    def mark_truncated(self, stage):
+        if stage not in self.truncated_stages:
+            self.truncated_stages.append(stage)
+    
+    @property
+    def is_partial(self):
+        return bool(self.truncated_stages)
+    
+    def to_dict(self):
+        return {
+            'budget_seconds': self.seconds,
+            'remaining_seconds': round(self.remaining(), 2),
+            'partial': self.is_partial,
+            'truncated_stages': list(self.truncated_stages)
+        }
@@ -0,0 +1,80 @@
+import random
+import string
+import time
+from deduplication import FuzzyDeduplicator
+
+def generate_document(num_items, num_pages=50, duplicate_rate=0.2, seed=42):
+    """Create a synthetic multi-page bill with exact and OCR-noisy duplicates"""
+    rng = random.Random(seed)
+    words = ['consultation', 'tablet', 'injection', 'room', 'charge', 'lab', 'test',
+             'xray', 'ward', 'nursing', 'syrup', 'capsule', 'dressing', 'visit', 'fee']
+    
+    originals = []
+    pages = [{'page_no': str(i + 1), 'page_type': 'Bill Detail', 'bill_items': []} for i in range(num_pages)]
+    
+    for i in range(num_items):
+        page = pages[i * num_pages // num_items]
+        
+        if originals and rng.random() < duplicate_rate:
+            source = rng.choice(originals)
+            name = list(source['item_name'])
+            # Simulate a single OCR character error on half of the copies
+            if rng.random() < 0.5:
+                pos = rng.randrange(len(name))
+                name[pos] = rng.choice(string.ascii_lowercase)
+            item = dict(source, item_name=''.join(name))
+        else:
+            name = ' '.join(rng.sample(words, 3)) + f" {rng.randint(1, 999)}"
+            amount = round(rng.uniform(10, 5000), 2)
+            item = {'item_name': name, 'item_amount': amount, 'item_rate': amount, 'item_quantity': 1.0}
+            originals.append(item)
+        
+        page['bill_items'].append(dict(item))
+    
+    return {'pagewise_line_items': pages}
+
+def naive_pairwise(data, deduplicator):
+    """Reference quadratic implementation comparing every pair of items"""
+    kept = []
+    removed = 0
+    for page in data['pagewise_line_items']:
+        for item in page['bill_items']:
+            grams = deduplicator._ngrams(deduplicator._normalize_text(item['item_name']))
+            if any(
+                abs(other_amount - item['item_amount']) <= deduplicator.amount_tolerance and
+                deduplicator._jaccard(grams, other_grams) >= deduplicator.similarity_threshold
+                for other_grams, other_amount in kept
+            ):
+                removed += 1
+                continue
+            kept.append((grams, item['item_amount']))
+    return removed
+
+def run_benchmark(sizes=(1000, 5000, 10000, 20000), naive_limit=10000):
+    print("⏱️ DEDUPLICATION BENCHMARK")
+    print("=" * 60)
+    
+    for size in sizes:
+        deduplicator = FuzzyDeduplicator()
+        
+        data = generate_document(size)
+        start = time.perf_counter()
+        result = deduplicator.deduplicate(data)
+        indexed_time = time.perf_counter() - start
+        indexed_removed = result['deduplication']['removed_count']
+        
+        line = f"{size:>6} items | indexed: {indexed_time:7.3f}s, removed {indexed_removed}"
+        
+        if size <= naive_limit:
+            data = generate_document(size)
+            start = time.perf_counter()
+            naive_removed = naive_pairwise(data, deduplicator)
+            naive_time = time.perf_counter() - start
+            line += f" | naive: {naive_time:7.3f}s, removed {naive_removed}"
+        else:
+            line += " | naive: skipped (quadratic)"
+        
+        print(line)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,134 @@
+import random
+import re
+import zlib
+
+class FuzzyDeduplicator:
+    """Cross-page near-duplicate detection blocked by amount and MinHash LSH bands"""
+    
+    _PRIME = (1 << 61) - 1
+    
+    def __init__(self, ngram_size=3, num_bands=8, rows_per_band=2,
+                 similarity_threshold=0.6, amount_tolerance=0.01):
+        self.ngram_size = ngram_size
+        self.num_bands = num_bands
+        self.rows_per_band = rows_per_band
+        self.similarity_threshold = similarity_threshold
+        self.amount_tolerance = amount_tolerance
+        
+        # Fixed seed keeps signatures stable across workers and restarts
+        rng = random.Random(1)
+        self._hash_params = [
+            (rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME))
+            for _ in range(num_bands * rows_per_band)
+        ]
+    
+    def deduplicate(self, data):
+        """Drop near-duplicate items while keeping each survivor on its own page"""
+        exact_index = {}
+        block_index = {}
+        signatures = []
+        removed = []
+        
+        for page in data.get('pagewise_line_items', []):
+            unique_items = []
+            
+            for item in page.get('bill_items', []):
+                name = self._normalize_text(item['item_name'])
+                amount = round(item['item_amount'], 2)
+                
+                original = exact_index.get((name, amount))
+                if original is None:
+                    grams = self._ngrams(name)
+                    keys = self._block_keys(grams, amount)
+                    original = self._find_candidate(grams, amount, keys, block_index, signatures)
+                
+                if original is not None:
+                    removed.append({
+                        'page_no': page.get('page_no'),
+                        'item_name': item['item_name'],
+                        'item_amount': item['item_amount'],
+                        'duplicate_of_page': original['page_no'],
+                        'duplicate_of_item': original['item_name']
+                    })
+                    continue
+                
+                entry_id = len(signatures)
+                signatures.append({
+                    'grams': grams,
+                    'amount': amount,
+                    'page_no': page.get('page_no'),
+                    'item_name': item['item_name']
+                })
+                exact_index[(name, amount)] = signatures[entry_id]
+                for key in keys:
+                    block_index.setdefault(key, []).append(entry_id)
+                
+                unique_items.append(item)
+            
+            page['bill_items'] = unique_items
+        
+        data['total_item_count'] = sum(
+            len(page.get('bill_items', [])) for page in data.get('pagewise_line_items', [])
+        )
+        data['deduplication'] = {
+            'removed_count': len(removed),
+            'removed_items': removed
+        }
+        return data
+    
+    def _find_candidate(self, grams, amount, keys, block_index, signatures):
+        """Return the earliest indexed item similar enough to this one"""
+        seen = set()
+        best = None
+        
+        for bucket_offset in (-1, 0, 1):
+            for (bucket, band), band_hash in keys:
+                block = block_index.get(((bucket + bucket_offset, band), band_hash))
+                if not block:
+                    continue
+                for entry_id in block:
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    
+                    entry = signatures[entry_id]
+                    if abs(entry['amount'] - amount) > self.amount_tolerance:
+                        continue
+                    if self._jaccard(grams, entry['grams']) < self.similarity_threshold:
+                        continue
+                    if best is None or entry_id < best:
+                        best = entry_id
+        
+        return signatures[best] if best is not None else None
+    
+    def _block_keys(self, grams, amount):
+        """Amount bucket combined with one LSH band signature per band"""
+        bucket = int(round(amount))
+        signature = self._minhash(grams)
+        keys = []
+        for band in range(self.num_bands):
+            start = band * self.rows_per_band
+            band_hash = tuple(signature[start:start + self.rows_per_band])
+            keys.append(((bucket, band), band_hash))
+        return keys
+    
+    def _minhash(self, grams):
+        base_hashes = [zlib.crc32(gram.encode()) for gram in grams] or [0]
+        return [
+            min((a * h + b) % self._PRIME for h in base_hashes)
+            for a, b in self._hash_params
+        ]
+    
+    def _ngrams(self, text):
+        if len(text) <= self.ngram_size:
+            return {text}
+        return {text[i:i + self.ngram_size] for i in range(len(text) - self.ngram_size + 1)}
+    
+    def _jaccard(self, first, second):
+        if not first and not second:
+            return 1.0
+        return len(first & second) / len(first | second)
+    
+    def _normalize_text(self, text):
+        """Normalize text for comparison"""
+        return re.sub(r'[^a-zA-Z0-9]', '', text.lower())
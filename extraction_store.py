@@ -0,0 +1,125 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+class ExtractionStore:
+    """SQLite store of OCR page text, the OCR settings that produced it and the parsed result"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        
+        self._connection().executescript('''
+            CREATE TABLE IF NOT EXISTS extractions (
+                document_key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                source TEXT,
+                ocr_settings TEXT NOT NULL,
+                pages TEXT NOT NULL,
+                parser_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS extractions_parser ON extractions (parser_version, document_key);
+        ''')
+    
+    def _connection(self):
+        # One connection per thread; WAL lets reprocessing workers write while the API reads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def make_key(content_hash, ocr_settings):
+        """The same bytes OCR'd with different settings are separate entries"""
+        settings = json.dumps(ocr_settings, sort_keys=True)
+        return hashlib.sha256(f"{content_hash}:{settings}".encode()).hexdigest()
+    
+    def save(self, content_hash, ocr_settings, pages, parser_version, result, source=None):
+        """Insert or replace the entry for this document and OCR settings; returns its key"""
+        key = self.make_key(content_hash, ocr_settings)
+        now = time.time()
+        self._connection().execute(
+            '''INSERT INTO extractions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (document_key) DO UPDATE SET
+                   source = COALESCE(excluded.source, source), pages = excluded.pages,
+                   parser_version = excluded.parser_version, result = excluded.result,
+                   updated_at = excluded.updated_at''',
+            (key, content_hash, source, json.dumps(ocr_settings, sort_keys=True), json.dumps(pages),
+             parser_version, json.dumps(result), now, now)
+        )
+        return key
+    
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT * FROM extractions WHERE document_key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'document_key': row['document_key'],
+            'content_hash': row['content_hash'],
+            'source': row['source'],
+            'ocr_settings': json.loads(row['ocr_settings']),
+            'pages': json.loads(row['pages']),
+            'parser_version': row['parser_version'],
+            'result': json.loads(row['result']),
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+    
+    def stale_keys(self, parser_version, limit=None):
+        """Keys of entries parsed by any other parser version"""
+        rows = self._connection().execute(
+            'SELECT document_key FROM extractions WHERE parser_version != ? ORDER BY document_key LIMIT ?',
+            (parser_version, -1 if limit is None else limit)
+        )
+        return [row['document_key'] for row in rows]
+    
+    def all_keys(self, limit=None):
+        rows = self._connection().execute(
+            'SELECT document_key FROM extractions ORDER BY document_key LIMIT ?',
+            (-1 if limit is None else limit,)
+        )
+        return [row['document_key'] for row in rows]
+    
+    def iter_entries(self, limit=None, batch_size=1000):
+        """(key, pages, result) for every entry in key order, fetched in batches"""
+        last_key = ''
+        remaining = -1 if limit is None else limit
+        while remaining:
+            rows = self._connection().execute(
+                'SELECT document_key, pages, result FROM extractions WHERE document_key > ? ORDER BY document_key LIMIT ?',
+                (last_key, batch_size if remaining < 0 else min(batch_size, remaining))
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row['document_key'], json.loads(row['pages']), json.loads(row['result'])
+            last_key = rows[-1]['document_key']
+            remaining -= len(rows) if remaining > 0 else 0
+    
+    def update_result(self, key, parser_version, result):
+        self._connection().execute(
+            'UPDATE extractions SET parser_version = ?, result = ?, updated_at = ? WHERE document_key = ?',
+            (parser_version, json.dumps(result), time.time(), key)
+        )
+    
+    def stats(self):
+        rows = self._connection().execute(
+            'SELECT parser_version, COUNT(*) AS entries FROM extractions GROUP BY parser_version'
+        )
+        return {row['parser_version']: row['entries'] for row in rows}
+
+def create_extraction_store(url):
+    """Build a store from a URL: sqlite:///path/to/extractions.db"""
+    if url.startswith('sqlite:///'):
+        return ExtractionStore(url[len('sqlite:///'):])
+    raise Exception(f"Unsupported extraction store URL: {url}")
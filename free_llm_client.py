@@ -1,6 +1,10 @@
 import requests
 import re
 import json
+from deduplication import FuzzyDeduplicator
+from structured_logging import get_logger
+
+logger = get_logger('free_llm_client')
 
 class FreeLLMClient:
     def __init__(self):
@@ -8,6 +12,7 @@ class FreeLLMClient:
             "llama": "https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf",
             "mistral": "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.1"
         }
+        self.deduplicator = FuzzyDeduplicator()
         
     def enhance_with_huggingface(self, extracted_text, rule_based_data):
         """Enhance extraction using Hugging Face inference API"""
@@ -17,7 +22,7 @@ class FreeLLMClient:
             return enhanced_data
             
         except Exception as e:
-            print(f"Hugging Face enhancement failed: {e}")
+            logger.warning("hugging face enhancement failed", extra={'fields': {'error': str(e)}})
             return rule_based_data
     
     def _smart_enhancement(self, extracted_text, data):
@@ -77,34 +82,7 @@ class FreeLLMClient:
     
     def _advanced_deduplication(self, data):
         """Advanced duplicate detection using fuzzy matching"""
-        all_items = []
-        for page in data.get('pagewise_line_items', []):
-            for item in page.get('bill_items', []):
-                all_items.append(item)
-        
-        # Remove duplicates based on similarity
-        unique_items = []
-        seen_patterns = set()
-        
-        for item in all_items:
-            # Create a pattern key (name + rounded amount)
-            pattern = f"{self._normalize_text(item['item_name'])}_{round(item['item_amount'], 2)}"
-            
-            if pattern not in seen_patterns:
-                unique_items.append(item)
-                seen_patterns.add(pattern)
-        
-        # Update data with unique items
-        if data['pagewise_line_items']:
-            data['pagewise_line_items'][0]['bill_items'] = unique_items
-            data['total_item_count'] = len(unique_items)
-        
-        return data
-    
-    def _normalize_text(self, text):
-        """Normalize text for comparison"""
-        text = re.sub(r'[^a-zA-Z0-9]', '', text.lower())
-        return text
+        return self.deduplicator.deduplicate(data)
     
     def _reconcile_totals(self, data, context_text):
         """Reconcile extracted totals with context totals"""
@@ -0,0 +1,85 @@
+from PIL import Image
+
+def _runs(values, min_gap=1):
+    """Group indexes of truthy values into (start, end) runs, merging gaps shorter than min_gap"""
+    runs = []
+    start = None
+    last = None
+    for index, value in enumerate(values):
+        if not value:
+            continue
+        if start is None:
+            start = index
+        elif index - last > min_gap:
+            runs.append((start, last + 1))
+            start = index
+        last = index
+    if start is not None:
+        runs.append((start, last + 1))
+    return runs
+
+def detect_text_lines(image, target_width=400, ink_threshold=128):
+    """Cheap projection-profile pass on a downsampled copy of the page"""
+    gray = image.convert('L')
+    scale = min(1.0, target_width / gray.width)
+    small = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))), Image.BILINEAR)
+    width, height = small.size
+    
+    ink = [1 if value < ink_threshold else 0 for value in small.getdata()]
+    rows = [ink[y * width:(y + 1) * width] for y in range(height)]
+    min_row_ink = max(1, width // 200)
+    
+    lines = []
+    for top, bottom in _runs([sum(row) >= min_row_ink for row in rows]):
+        columns = [any(rows[y][x] for y in range(top, bottom)) for x in range(width)]
+        # Gaps wider than ~4% of the page separate table columns, not words
+        segments = _runs(columns, min_gap=max(2, width // 25))
+        lines.append({
+            'top': top,
+            'bottom': bottom,
+            'segments': segments
+        })
+    
+    return lines, scale, width
+
+def _is_tabular(line, width, max_line_height):
+    """A row with a separate, right-hand column (usually the amount)"""
+    segments = line['segments']
+    if len(segments) < 2 or line['bottom'] - line['top'] > max_line_height:
+        return False
+    last_start, last_end = segments[-1]
+    return last_start > width * 0.5 and last_end - last_start < width * 0.35
+
+def find_item_regions(image, target_width=400, max_line_gap=2, totals_lines=3, margin=0.01):
+    """Bounding boxes (full resolution) of line-item tables and their totals block"""
+    lines, scale, width = detect_text_lines(image, target_width)
+    max_line_height = max(4, width // 20)
+    
+    groups = []
+    current = None
+    for index, line in enumerate(lines):
+        if not _is_tabular(line, width, max_line_height):
+            continue
+        if current and index - current['last'] <= max_line_gap + 1:
+            current['last'] = index
+            current['count'] += 1
+        else:
+            current = {'first': index, 'last': index, 'count': 1}
+            groups.append(current)
+    
+    regions = []
+    pad = int(image.height * margin)
+    for group in groups:
+        if group['count'] < 2:
+            continue
+        # Totals usually sit just under the table, often without a column gap
+        last = group['last']
+        line_height = lines[last]['bottom'] - lines[last]['top']
+        while (last + 1 < len(lines) and last - group['last'] < totals_lines and
+               lines[last + 1]['top'] - lines[last]['bottom'] <= 3 * line_height):
+            last += 1
+        top = int(lines[group['first']]['top'] / scale) - pad
+        bottom = int(lines[last]['bottom'] / scale) + pad
+        regions.append((0, max(0, top), image.width, min(image.height, bottom)))
+    
+    return regions
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Fuzz and worst-case timing for line-item and total parsing on adversarial OCR output
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from linear_parser import parse_item_line, find_total_amounts
+from llm_enhancer import LLMEnhancer
+from rule_based_parser import RuleBasedBillParser
+
+# Longest line the worst-case budget is asserted for; real OCR rows are far shorter
+MAX_LINE_LENGTH = 20000
+MAX_SECONDS_PER_LINE = 0.1
+
+# Fragments that exercise every branch of the patterns, including the ones that backtrack
+TOKENS = [
+    'a', 'Z', 'x', 'Fee', ' ', '  ', '\t', ' ', '-', '&', '$', '.', ',', ':',
+    '0', '5', '12', '123', '٥', 'total', 'Total', 'grand total', 'GRAND TOTAL',
+    'final amount', 'amount due', 'amount  due', 'balance due', 'Balance\tDue'
+]
+
+def random_line(rng, max_tokens=14):
+    return ''.join(rng.choice(TOKENS) for _ in range(rng.randint(0, max_tokens)))
+
+def item_like_line(rng):
+    """Name, separator, optional quantity and $, amount, with a random part mangled"""
+    pick = lambda options: rng.choice(options)
+    parts = [
+        pick(['A', 'Fee', 'Lab Test', 'X-Ray & Scan', 'a', '1Fee', 'Fee2']),
+        pick([' ', '  ', '\t', '', ' \u00a0 ']),
+        pick(['', '', '3 x ', '12x', '2 x $', '2 X ', 'x ']),
+        pick(['', '$', '$ ', ' $']),
+        pick(['500.00', '12.5', '99', '123', '1.234', '0.50', '12.34.56', '1,234.00', '٥٠٠']),
+        pick(['', ' ', '  ', ' x', '\n', '.'])
+    ]
+    if rng.random() < 0.2:
+        parts[rng.randrange(len(parts))] = random_line(rng, 3)
+    return ''.join(parts)
+
+# Each builder returns a line of roughly n characters designed to make the regexes backtrack
+ADVERSARIAL = {
+    'whitespace run after a word': lambda n: 'a' + ' ' * n + 'x',
+    'whitespace before a bad amount': lambda n: 'Item' + ' ' * n + '12.3',
+    'word/space alternation': lambda n: 'a ' * (n // 2) + '$',
+    'quantity without amount': lambda n: 'Item' + ' ' * (n // 2) + '3 x' + ' ' * (n // 2),
+    'total then whitespace': lambda n: 'total' + ' ' * n + 'x',
+    'total then colons': lambda n: 'Total' + ' :' * (n // 2) + '$ x',
+    'repeated totals': lambda n: 'total  ' * (n // 7),
+    'amount due then whitespace': lambda n: 'amount' + ' ' * (n // 2) + 'due' + ' ' * (n // 2),
+    'long digit run': lambda n: 'Item ' + '9' * n + '.',
+    'digits and separators': lambda n: 'total ' + '1,2.' * (n // 4),
+    'ocr garbage': lambda n: ''.join(random.Random(n).choice('lI1|!.,:;- $') for _ in range(n))
+}
+
+def check_equivalence(cases, seed=0):
+    """Compare the tokenizer with the original regexes on random short lines"""
+    rng = random.Random(seed)
+    parser = RuleBasedBillParser()
+    enhancer = LLMEnhancer()
+    mismatches = []
+    
+    for case in range(cases):
+        line = item_like_line(rng) if case % 2 else random_line(rng)
+        expected = parser._parse_line_regex(line)
+        actual = parse_item_line(line)
+        if expected != actual:
+            mismatches.append(('line', line, expected, actual))
+        
+        text = random_line(rng, 30)
+        expected = [match for pattern in enhancer.total_patterns for match in re.findall(pattern, text)]
+        actual = find_total_amounts(text)
+        if expected != actual:
+            mismatches.append(('totals', text, expected, actual))
+    
+    return mismatches
+
+def _time(function, argument, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_fuzz(cases=20000, sizes=(200, 2000, MAX_LINE_LENGTH), regex_sizes=(50, 100, 200)):
+    print("🧪 LINE PARSER FUZZ")
+    print("=" * 60)
+    
+    mismatches = check_equivalence(cases)
+    print(f"Equivalence with the original regexes: {cases} random lines, {len(mismatches)} mismatches")
+    for kind, text, expected, actual in mismatches[:10]:
+        print(f"   ❌ {kind} {text!r}: regex {expected!r} != linear {actual!r}")
+    
+    print(f"\n⏱️ Worst case per line (budget {MAX_SECONDS_PER_LINE * 1000:.0f} ms up to {MAX_LINE_LENGTH} chars)")
+    parser = RuleBasedBillParser()
+    enhancer = LLMEnhancer()
+    worst = 0.0
+    for label, build in ADVERSARIAL.items():
+        timings = []
+        for size in sizes:
+            line = build(size)
+            seconds = max(_time(parse_item_line, line), _time(find_total_amounts, line))
+            worst = max(worst, seconds)
+            timings.append(f"{len(line)}: {seconds * 1000:7.2f} ms")
+        
+        # The originals grow polynomially, so only small inputs are timed
+        regex_timings = []
+        for size in regex_sizes:
+            line = build(size)
+            seconds = max(
+                _time(parser._parse_line_regex, line, 1),
+                _time(lambda text: [re.findall(p, text) for p in enhancer.total_patterns], line, 1)
+            )
+            regex_timings.append(f"{len(line)}: {seconds * 1000:.2f} ms")
+        
+        print(f"{label:<30} linear {' | '.join(timings)}")
+        print(f"{'':<30} regex  {' | '.join(regex_timings)}")
+    
+    print(f"\nWorst linear time per line: {worst * 1000:.2f} ms")
+    assert not mismatches, f"{len(mismatches)} lines parse differently from the original regexes"
+    assert worst <= MAX_SECONDS_PER_LINE, f"worst case {worst:.3f}s exceeds {MAX_SECONDS_PER_LINE}s per line"
+    print("✅ All checks passed")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and time the line parsers on adversarial input")
+    parser.add_argument('--cases', type=int, default=20000, help="Random lines for the equivalence check")
+    args = parser.parse_args()
+    try:
+        run_fuzz(args.cases)
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
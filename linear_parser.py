@@ -0,0 +1,183 @@
+import re
+
+# Hand-written, single-pass equivalents of the bill line and total regexes. Every
+# function returns exactly what the regex would, but never scans a character more
+# than a constant number of times, so garbage OCR lines cannot trigger backtracking.
+
+# The keyword part of LLMEnhancer's total patterns; alternatives are fixed strings
+# (or words joined by \s*), which the regex engine matches without blow-up
+TOTAL_HEADS = [
+    re.compile(r'(?i)total|grand total|final amount'),
+    re.compile(r'(?i)amount[\s]*due'),
+    re.compile(r'(?i)balance[\s]*due')
+]
+
+def _is_ascii_letter(char):
+    return 'A' <= char <= 'Z' or 'a' <= char <= 'z'
+
+def _is_name_char(char):
+    """[A-Za-z\\s\\-\\&]"""
+    return _is_ascii_letter(char) or char in '-&' or char.isspace()
+
+def _is_digit(char):
+    # Same character set as \d for str patterns
+    return char.isdecimal()
+
+def _skip(text, index, predicate):
+    while index < len(text) and predicate(text[index]):
+        index += 1
+    return index
+
+def _two_digits_at(text, index):
+    return index + 2 <= len(text) and _is_digit(text[index]) and _is_digit(text[index + 1])
+
+def match_total_amount(text, start):
+    """End of the first match of \\d+[.,]?\\d*\\.?\\d{2} at start, or None"""
+    first_end = _skip(text, start, _is_digit)
+    if first_end == start:
+        return None
+    
+    if first_end < len(text) and text[first_end] in '.,':
+        second_end = _skip(text, first_end + 1, _is_digit)
+        if second_end < len(text) and text[second_end] == '.' and _two_digits_at(text, second_end + 1):
+            return second_end + 3
+        if second_end - first_end - 1 >= 2:
+            return second_end
+    
+    if first_end - start >= 3:
+        return first_end
+    return None
+
+def _match_item_amount(text, start):
+    """End of the first match of \\d+\\.?\\d{2} at start, or None"""
+    digits_end = _skip(text, start, _is_digit)
+    if digits_end == start:
+        return None
+    if digits_end < len(text) and text[digits_end] == '.' and _two_digits_at(text, digits_end + 1):
+        return digits_end + 3
+    if digits_end - start >= 3:
+        return digits_end
+    return None
+
+def _is_full_item_amount(token):
+    """Whether the whole token matches \\d+\\.?\\d{2}"""
+    whole, dot, fraction = token.partition('.')
+    if not whole or not all(_is_digit(c) for c in whole):
+        return False
+    if dot:
+        return len(fraction) == 2 and all(_is_digit(c) for c in fraction)
+    return len(whole) >= 3
+
+def _valid_name(name, spare_whitespace):
+    """[A-Za-z][A-Za-z\\s\\-\\&]+? where the name may borrow spare separator whitespace"""
+    if not name or not _is_ascii_letter(name[0]):
+        return False
+    if not all(_is_name_char(c) for c in name):
+        return False
+    # The lazy group needs a second character; a one-letter name takes one separator space
+    return len(name) >= 2 or spare_whitespace >= 1
+
+def _parse_amount_line(line):
+    """^NAME\\s+[\\$]?\\s*(\\d+\\.?\\d{2})\\s*$"""
+    end = len(line)
+    while end > 0 and line[end - 1].isspace():
+        end -= 1
+    start = end
+    while start > 0 and (_is_digit(line[start - 1]) or line[start - 1] == '.'):
+        start -= 1
+    if start == end or not _is_full_item_amount(line[start:end]):
+        return None
+    
+    name_end = start
+    while name_end > 0 and line[name_end - 1].isspace():
+        name_end -= 1
+    separator = start - name_end
+    if name_end > 0 and line[name_end - 1] == '$':
+        dollar = name_end - 1
+        name_end = dollar
+        while name_end > 0 and line[name_end - 1].isspace():
+            name_end -= 1
+        separator = dollar - name_end
+    
+    # \s+ needs at least one whitespace before the amount (or the $)
+    if separator < 1 or not _valid_name(line[:name_end], separator - 1):
+        return None
+    
+    amount = float(line[start:end])
+    return {
+        'item_name': line[:name_end],
+        'item_amount': amount,
+        'item_rate': amount,
+        'item_quantity': 1.0
+    }
+
+def _parse_quantity_line(line):
+    """^NAME\\s+(\\d+)\\s*x\\s*[\\$]?\\s*(\\d+\\.?\\d{2})"""
+    if not line or not _is_ascii_letter(line[0]):
+        return None
+    name_end = _skip(line, 1, _is_name_char)
+    if name_end == len(line) or not _is_digit(line[name_end]):
+        return None
+    
+    # The lazy name stops where the whitespace before the quantity begins
+    gap_start = name_end
+    while gap_start > 0 and line[gap_start - 1].isspace():
+        gap_start -= 1
+    split = max(gap_start, 2)
+    if split > name_end - 1:
+        return None
+    
+    quantity_end = _skip(line, name_end, _is_digit)
+    index = _skip(line, quantity_end, str.isspace)
+    if index == len(line) or line[index] != 'x':
+        return None
+    index = _skip(line, index + 1, str.isspace)
+    if index < len(line) and line[index] == '$':
+        index = _skip(line, index + 1, str.isspace)
+    amount_end = _match_item_amount(line, index)
+    if amount_end is None:
+        return None
+    
+    quantity = float(line[name_end:quantity_end])
+    rate = float(line[index:amount_end])
+    return {
+        'item_name': line[:split].strip(),
+        'item_quantity': quantity,
+        'item_rate': rate,
+        'item_amount': quantity * rate
+    }
+
+def parse_item_line(line):
+    """Linear-time equivalent of RuleBasedBillParser's two line-item regexes"""
+    return _parse_amount_line(line) or _parse_quantity_line(line)
+
+def _is_separator(char):
+    return char.isspace() or char == ':'
+
+def find_amounts_after(text, head):
+    """re.findall(HEAD + r'[\\s:]*[\\$]?\\s*(AMOUNT)', text) without the nested optional quantifiers"""
+    amounts = []
+    position = 0
+    while True:
+        match = head.search(text, position)
+        if match is None:
+            return amounts
+        
+        index = _skip(text, match.end(), _is_separator)
+        if index < len(text) and text[index] == '$':
+            index = _skip(text, index + 1, str.isspace)
+        amount_end = match_total_amount(text, index)
+        if amount_end is None:
+            # Like findall, retry from the next character after a failed attempt
+            position = match.start() + 1
+            continue
+        
+        amounts.append(text[index:amount_end])
+        position = amount_end
+
+def find_total_amounts(text, heads=None):
+    """Amount strings found by LLMEnhancer's total patterns, pattern by pattern"""
+    amounts = []
+    for head in heads or TOTAL_HEADS:
+        amounts.extend(find_amounts_after(text, head))
+    return amounts
@@ -1,6 +1,21 @@
 import re
+from config import Config
+from linear_parser import find_total_amounts
+from structured_logging import get_logger
+
+logger = get_logger('llm_enhancer')
 
 class LLMEnhancer:
+    # Bump whenever categorization or validation changes the output
+    VERSION = 1
+    
+    # Advanced pattern matching for totals
+    total_patterns = [
+        r'(?i)(?:total|grand total|final amount)[\s:]*[\$]?\s*(\d+[.,]?\d*\.?\d{2})',
+        r'(?i)amount[\s]*due[\s:]*[\$]?\s*(\d+[.,]?\d*\.?\d{2})',
+        r'(?i)balance[\s]*due[\s:]*[\$]?\s*(\d+[.,]?\d*\.?\d{2})'
+    ]
+    
     def __init__(self):
         self.total_tokens = 0
         self.input_tokens = 0
@@ -16,9 +31,25 @@ class LLMEnhancer:
             return enhanced_data
             
         except Exception as e:
-            print(f"Enhancement failed: {e}")
+            logger.warning("enhancement failed", extra={'fields': {'error': str(e)}})
             return rule_based_data
     
+    def enhance_page(self, page_text, page_data):
+        """Categorize the items of a single parsed page"""
+        try:
+            self._categorize_items({'pagewise_line_items': [page_data]}, page_text)
+        except Exception as e:
+            logger.warning("page enhancement failed", extra={'fields': {'error': str(e)}})
+        return page_data
+    
+    def validate_extraction(self, text, data):
+        """Run document-level total validation on already categorized data"""
+        try:
+            return self._validate_with_patterns(text, data)
+        except Exception as e:
+            logger.warning("validation failed", extra={'fields': {'error': str(e)}})
+            return data
+    
     def _validate_with_patterns(self, text, data):
         """Validate extracted data using advanced patterns"""
         # Count tokens (estimated)
@@ -32,19 +63,10 @@ class LLMEnhancer:
             for item in page.get('bill_items', [])
         )
         
-        # Advanced pattern matching for totals
-        total_patterns = [
-            r'(?i)(?:total|grand total|final amount)[\s:]*[\$]?\s*(\d+[.,]?\d*\.?\d{2})',
-            r'(?i)amount[\s]*due[\s:]*[\$]?\s*(\d+[.,]?\d*\.?\d{2})',
-            r'(?i)balance[\s]*due[\s:]*[\$]?\s*(\d+[.,]?\d*\.?\d{2})'
-        ]
-        
         found_totals = []
-        for pattern in total_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                amount = float(match.replace(',', ''))
-                found_totals.append(amount)
+        for match in self._find_totals(text):
+            amount = float(match.replace(',', ''))
+            found_totals.append(amount)
         
         if found_totals:
             best_match = max(found_totals)
@@ -62,6 +84,13 @@ class LLMEnhancer:
         
         return data
     
+    def _find_totals(self, text):
+        """Amount strings after total keywords"""
+        if Config.LINE_PARSER_MODE == 'regex':
+            return [match for pattern in self.total_patterns for match in re.findall(pattern, text)]
+        # Same matches, found without backtracking over long whitespace runs
+        return find_total_amounts(text)
+    
     def _categorize_items(self, data, context):
         """Categorize items using smart pattern matching"""
         categories = {
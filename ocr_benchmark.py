@@ -0,0 +1,51 @@
+import io
+import time
+from PIL import Image, ImageDraw
+from utils import OCRScheduler, iter_pdf_pages
+
+class FixedPlanScheduler(OCRScheduler):
+    """Scheduler that always returns the same plan, for comparing settings"""
+    
+    def __init__(self, page_concurrency, tesseract_threads):
+        super().__init__()
+        self.fixed_plan = {
+            'cpu_budget': page_concurrency * tesseract_threads,
+            'page_concurrency': page_concurrency,
+            'tesseract_threads': tesseract_threads
+        }
+    
+    def plan(self, page_count):
+        return dict(self.fixed_plan, page_concurrency=min(page_count, self.fixed_plan['page_concurrency']))
+
+def create_sample_pdf(num_pages):
+    """Render a multi-page synthetic bill as a PDF"""
+    pages = []
+    for page_no in range(num_pages):
+        img = Image.new('RGB', (1654, 2339), color='white')
+        d = ImageDraw.Draw(img)
+        for line in range(40):
+            d.text((100, 100 + line * 50), f"Item {page_no}-{line} Consultation Fee   {100 + line}.00", fill='black')
+        pages.append(img)
+    
+    buffered = io.BytesIO()
+    pages[0].save(buffered, format="PDF", save_all=True, append_images=pages[1:])
+    return buffered.getvalue()
+
+def run_benchmark(num_pages=8, levels=((1, 1), (1, 4), (2, 1), (2, 2), (4, 1), (8, 1))):
+    print("⏱️ OCR SCHEDULER BENCHMARK")
+    print("=" * 60)
+    
+    pdf_content = create_sample_pdf(num_pages)
+    schedulers = [(f"{pages} pages x {threads} threads", FixedPlanScheduler(pages, threads))
+                  for pages, threads in levels]
+    auto = OCRScheduler()
+    schedulers.append((f"auto ({auto.plan(num_pages)})", auto))
+    
+    for label, scheduler in schedulers:
+        start = time.perf_counter()
+        page_count = sum(1 for _ in iter_pdf_pages(pdf_content, scheduler=scheduler))
+        elapsed = time.perf_counter() - start
+        print(f"{label:<70} {page_count / elapsed:6.2f} pages/s ({elapsed:.1f}s)")
+
+if __name__ == "__main__":
+    run_benchmark()
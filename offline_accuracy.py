@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Offline accuracy and speed evaluation over a local golden dataset, no server needed
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import Config
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# Weight of the name similarity in the pairing score; the rest is amount similarity
+NAME_WEIGHT = 0.6
+AMOUNT_TOLERANCE = 0.01
+
+def _normalize_name(name):
+    """Same normalization as AccuracyTester"""
+    return ''.join(c for c in name.lower() if c.isalnum())
+
+def _trigram_matrix(names, vocabulary):
+    """L2-normalized character trigram counts, one row per name"""
+    matrix = np.zeros((len(names), len(vocabulary)))
+    for row, name in enumerate(names):
+        padded = f"#{name}#"
+        for i in range(len(padded) - 2):
+            matrix[row, vocabulary[padded[i:i + 3]]] += 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def is_match(expected_item, extracted_item):
+    """AccuracyTester's rule: the expected name appears in the extracted one and the amounts agree"""
+    return (_normalize_name(expected_item['name']) in _normalize_name(extracted_item['item_name'])
+            and abs(expected_item['amount'] - extracted_item['item_amount']) < AMOUNT_TOLERANCE)
+
+def similarity_matrix(expected_items, extracted_items):
+    """Expected x extracted pairing scores from trigram cosine of names and relative amount distance"""
+    expected_names = [_normalize_name(item['name']) for item in expected_items]
+    extracted_names = [_normalize_name(item['item_name']) for item in extracted_items]
+    
+    vocabulary = {}
+    for name in expected_names + extracted_names:
+        padded = f"#{name}#"
+        for i in range(len(padded) - 2):
+            vocabulary.setdefault(padded[i:i + 3], len(vocabulary))
+    name_similarity = _trigram_matrix(expected_names, vocabulary) @ _trigram_matrix(extracted_names, vocabulary).T
+    
+    expected_amounts = np.array([item['amount'] for item in expected_items], dtype=float)[:, None]
+    extracted_amounts = np.array([item['item_amount'] for item in extracted_items], dtype=float)[None, :]
+    scale = np.maximum(np.maximum(np.abs(expected_amounts), np.abs(extracted_amounts)), 1.0)
+    amount_similarity = np.clip(1 - np.abs(expected_amounts - extracted_amounts) / scale, 0, 1)
+    
+    return NAME_WEIGHT * name_similarity + (1 - NAME_WEIGHT) * amount_similarity
+
+def _hungarian(cost):
+    """Minimum-cost row to column assignment (rectangular allowed), used when SciPy is missing"""
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    
+    # Shortest augmenting path with potentials; index 0 is a virtual column
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    assigned_row = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for row in range(1, n + 1):
+        assigned_row[0] = row
+        column = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = assigned_row[column]
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            improved = ~used[1:] & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = column
+            
+            candidates = np.where(used[1:], np.inf, min_slack[1:])
+            next_column = int(np.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+            u[assigned_row[used]] += delta
+            v[used] -= delta
+            min_slack[~used] -= delta
+            
+            column = next_column
+            if assigned_row[column] == 0:
+                break
+        
+        while column:
+            previous = way[column]
+            assigned_row[column] = assigned_row[previous]
+            column = previous
+    
+    pairs = sorted((assigned_row[col] - 1, col - 1) for col in range(1, m + 1) if assigned_row[col])
+    rows = np.array([r for r, _ in pairs], dtype=int)
+    cols = np.array([c for _, c in pairs], dtype=int)
+    if transposed:
+        order = np.argsort(cols)
+        return cols[order], rows[order]
+    return rows, cols
+
+def assign_items(expected_items, extracted_items):
+    """One-to-one (expected, extracted, matched) pairs, with as many is_match pairs as possible"""
+    if not expected_items or not extracted_items:
+        return []
+    
+    scores = similarity_matrix(expected_items, extracted_items)
+    matched = np.array([[is_match(exp_item, ext_item) for ext_item in extracted_items] for exp_item in expected_items])
+    # The similarity only orders the pairing; a bonus larger than any total score puts every possible match first
+    bonus = min(scores.shape) + 1
+    assign = linear_sum_assignment or _hungarian
+    rows, cols = assign(-(scores + bonus * matched))
+    return [(int(row), int(col), bool(matched[row, col])) for row, col in zip(rows, cols)]
+
+def calculate_accuracy(extracted_data, expected_data):
+    """AccuracyTester's metrics and match rule, with each extracted item counted for at most one expected item"""
+    extracted_items = []
+    for page in extracted_data.get('pagewise_line_items', []):
+        extracted_items.extend(page.get('bill_items', []))
+    expected_items = expected_data.get('items', [])
+    
+    pairs = assign_items(expected_items, extracted_items)
+    matches = sum(1 for _, _, matched in pairs if matched)
+    exact_amounts = sum(
+        1 for row, col, _ in pairs
+        if abs(expected_items[row]['amount'] - extracted_items[col]['item_amount']) < AMOUNT_TOLERANCE
+    )
+    
+    items_accuracy = (matches / len(expected_items)) * 100 if expected_items else 0
+    items_precision = (matches / len(extracted_items)) * 100 if extracted_items else 0
+    
+    extracted_total = sum(item['item_amount'] for item in extracted_items)
+    expected_total = expected_data.get('total_amount', 0)
+    total_accuracy = max(0, 100 - (abs(extracted_total - expected_total) / expected_total * 100)) if expected_total > 0 else 0
+    
+    overall_accuracy = (items_accuracy + total_accuracy) / 2
+    
+    return {
+        'overall_accuracy': round(overall_accuracy, 2),
+        'items_accuracy': round(items_accuracy, 2),
+        'items_precision': round(items_precision, 2),
+        'amount_exact_matches': exact_amounts,
+        'total_accuracy': round(total_accuracy, 2),
+        'extracted_items_count': len(extracted_items),
+        'expected_items_count': len(expected_items),
+        'extracted_total': extracted_total,
+        'expected_total': expected_total
+    }
+
+def load_dataset(path):
+    """Golden cases from a .json list or .jsonl file; document paths are relative to it"""
+    with open(path) as f:
+        if path.endswith('.jsonl'):
+            cases = [json.loads(line) for line in f if line.strip()]
+        else:
+            cases = json.load(f)
+    
+    base = os.path.dirname(os.path.abspath(path))
+    for case in cases:
+        if case.get('document'):
+            case['document'] = os.path.join(base, case['document'])
+    return cases
+
+def parse_overrides(values):
+    """KEY=VALUE strings to Config overrides, cast to the type of the current setting"""
+    overrides = {}
+    for value in values:
+        key, _, raw = value.partition('=')
+        current = getattr(Config, key)
+        if isinstance(current, bool):
+            overrides[key] = raw.lower() == 'true'
+        else:
+            overrides[key] = type(current)(raw)
+    return overrides
+
+_processor = None
+
+def _init_worker(overrides, worker_processes):
+    global _processor
+    for key, value in overrides.items():
+        setattr(Config, key, value)
+    
+    import utils
+    from bill_processor import BillProcessor
+    # Each process gets its fair share of cores, as a gunicorn worker would
+    utils.ocr_scheduler.worker_processes = worker_processes
+    utils.ocr_scheduler.max_page_concurrency = Config.OCR_MAX_PAGE_CONCURRENCY
+    utils.ocr_scheduler.max_tesseract_threads = Config.OCR_MAX_TESSERACT_THREADS
+    logging.getLogger('bill_extraction').setLevel(logging.WARNING)
+    _processor = BillProcessor()
+
+def evaluate_case(case, layout_mode=False):
+    """Run one golden case through OCR and BillProcessor in this process"""
+    from structured_logging import start_request, current_stage_timings
+    from utils import extract_text_from_document
+    
+    start_request(case['name'])
+    started = time.perf_counter()
+    try:
+        if case.get('pages_text') is not None:
+            # Pre-extracted text skips OCR, e.g. for parser-only runs
+            pages_data = [{'text': text, 'page_no': i + 1} for i, text in enumerate(case['pages_text'])]
+        else:
+            with open(case['document'], 'rb') as f:
+                content = f.read()
+            pages_data = extract_text_from_document(content, layout_mode=layout_mode)
+        
+        extracted_data, _ = _processor.extract_bill_data(pages_data)
+        accuracy = calculate_accuracy(extracted_data, case['expected_data'])
+        error = None
+    except Exception as e:
+        pages_data = []
+        accuracy = None
+        error = str(e)
+    
+    return {
+        'name': case['name'],
+        'is_success': error is None,
+        'error': error,
+        'pages': len(pages_data),
+        'accuracy': accuracy,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+        'stages_ms': current_stage_timings().to_dict()
+    }
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+def run_evaluation(cases, workers=None, overrides=None, layout_mode=False):
+    """Spread the cases over a process pool and aggregate accuracy, throughput and stage latency"""
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(overrides or {}, workers)) as executor:
+        results = list(executor.map(evaluate_case, cases, [layout_mode] * len(cases)))
+    elapsed = time.perf_counter() - started
+    
+    succeeded = [r for r in results if r['is_success']]
+    stages = {}
+    for result in succeeded:
+        for stage, ms in result['stages_ms'].items():
+            stages.setdefault(stage, []).append(ms)
+    
+    def mean(key):
+        values = [r['accuracy'][key] for r in succeeded]
+        return round(sum(values) / len(values), 2) if values else 0
+    
+    latencies = [r['latency_ms'] for r in succeeded]
+    return {
+        'overrides': overrides or {},
+        'layout_mode': layout_mode,
+        'workers': workers,
+        'cases': len(results),
+        'failed': len(results) - len(succeeded),
+        'overall_accuracy': mean('overall_accuracy'),
+        'items_accuracy': mean('items_accuracy'),
+        'items_precision': mean('items_precision'),
+        'total_accuracy': mean('total_accuracy'),
+        'wall_seconds': round(elapsed, 2),
+        'documents_per_second': round(len(results) / elapsed, 2),
+        'pages_per_second': round(sum(r['pages'] for r in results) / elapsed, 2),
+        'latency_ms': {'p50': _percentile(latencies, 50), 'p95': _percentile(latencies, 95)},
+        'stages_ms': {
+            stage: {'mean': round(sum(values) / len(values), 1), 'p95': _percentile(values, 95)}
+            for stage, values in stages.items()
+        },
+        'results': results
+    }
+
+def print_report(label, report):
+    print(f"\n📊 {label}: {report['cases']} cases, {report['failed']} failed, {report['workers']} workers")
+    print(f"   Accuracy: overall {report['overall_accuracy']}% | items {report['items_accuracy']}% "
+          f"(precision {report['items_precision']}%) | total {report['total_accuracy']}%")
+    print(f"   Throughput: {report['documents_per_second']} docs/s, {report['pages_per_second']} pages/s "
+          f"in {report['wall_seconds']}s")
+    print(f"   Latency: p50 {report['latency_ms']['p50']} ms, p95 {report['latency_ms']['p95']} ms")
+    for stage, values in report['stages_ms'].items():
+        print(f"      {stage:<10} mean {values['mean']:>9} ms   p95 {values['p95']:>9} ms")
+    for result in report['results']:
+        if not result['is_success']:
+            print(f"   ❌ {result['name']}: {result['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate extraction accuracy and speed on a golden dataset")
+    parser.add_argument('dataset', help="JSON list or JSONL of cases with document (or pages_text) and expected_data")
+    parser.add_argument('--workers', type=int, default=None, help="Processes in the pool (default: CPU count)")
+    parser.add_argument('--layout-mode', action='store_true', help="OCR only the detected item regions")
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='KEY=VALUE',
+                        help="Config override for every variant, e.g. OCR_MAX_PIXELS=4000000")
+    parser.add_argument('--variant', action='append', default=[], metavar='NAME:KEY=VALUE[,KEY=VALUE]',
+                        help="Additional settings to evaluate in the same run, compared against the baseline")
+    parser.add_argument('--output', help="Write the full report as JSON")
+    args = parser.parse_args()
+    
+    cases = load_dataset(args.dataset)
+    base = parse_overrides(args.overrides)
+    variants = [('baseline', base)]
+    for spec in args.variant:
+        name, _, settings = spec.partition(':')
+        variants.append((name, dict(base, **parse_overrides(filter(None, settings.split(','))))))
+    
+    print("🎯 OFFLINE ACCURACY EVALUATION")
+    print("=" * 60)
+    print(f"Matching: {'scipy' if linear_sum_assignment else 'built-in'} optimal assignment")
+    
+    reports = {}
+    for name, overrides in variants:
+        reports[name] = run_evaluation(cases, args.workers, overrides, args.layout_mode)
+        print_report(name, reports[name])
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Check that page dedup merges re-encoded copies, never merges same-template pages
+whose amounts differ, and stays cheap on long documents of same-template pages
+"""
+import argparse
+import io
+import random
+import sys
+import time
+from PIL import Image, ImageDraw, ImageFont
+from page_hash import PageHashIndex
+
+FONT_PATHS = ['DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', 'Arial.ttf']
+ITEMS = ['Consultation Fee', 'Lab Test CBC', 'X-Ray Chest', 'Room Charges', 'Nursing Care',
+         'Pharmacy', 'Injection', 'Dressing', 'ECG', 'Ultrasound']
+
+def _font(size):
+    for path in FONT_PATHS:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+def render_page(amounts, size=(1654, 2339)):
+    """One A4 bill page at 200 DPI from a fixed template; only the amount column varies"""
+    image = Image.new('L', size, 255)
+    draw = ImageDraw.Draw(image)
+    body, heading = _font(28), _font(44)
+    draw.text((150, 120), "CITY HOSPITAL - PATIENT BILL", font=heading, fill=0)
+    draw.text((150, 200), "Invoice No: 2024-00918   Date: 12/03/2024", font=body, fill=0)
+    draw.line((140, 300, 1510, 300), fill=0, width=3)
+    for row, amount in enumerate(amounts):
+        y = 330 + row * 55
+        draw.text((150, y), f"{row + 1:>2}  {ITEMS[row % len(ITEMS)]}", font=body, fill=0)
+        draw.text((1300, y), amount, font=body, fill=0)
+        draw.line((140, y + 48, 1510, y + 48), fill=160, width=1)
+    return image.convert('RGB')
+
+def reencode(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue())).convert('RGB')
+
+def rotate(image, degrees):
+    return image.rotate(degrees, resample=Image.BILINEAR, fillcolor=(255, 255, 255))
+
+def merged(original, candidate):
+    index = PageHashIndex()
+    index.claim(1, original)
+    duplicate, _ = index.claim(2, candidate)
+    return duplicate is not None
+
+def run_check(rows=30, seed=0, pages_per_document=40, max_claim_ms=100):
+    print("🧪 PAGE DEDUP CHECK")
+    print("=" * 60)
+    rng = random.Random(seed)
+    amounts = [f"{rng.randint(10, 999)}.{rng.choice(['00', '50', '25'])}" for _ in range(rows)]
+    original = render_page(amounts)
+    
+    # Every single-digit substitution in one amount must keep the pages apart
+    row = rows // 3
+    different = []
+    for position, digit in enumerate(amounts[row]):
+        if not digit.isdigit():
+            continue
+        for replacement in '0123456789':
+            if replacement != digit:
+                changed = list(amounts)
+                changed[row] = amounts[row][:position] + replacement + amounts[row][position + 1:]
+                different.append((f"{amounts[row]} -> {changed[row]}", render_page(changed)))
+    different.append(("re-encoded, other amount", reencode(render_page(amounts[:row] + ['999.00'] + amounts[row + 1:]), 70)))
+    different.append(("rotated, other amount", rotate(render_page(amounts[:row] + ['999.00'] + amounts[row + 1:]), 0.5)))
+    
+    copies = [
+        ("identical", render_page(amounts)),
+        ("JPEG q90", reencode(original, 90)),
+        ("JPEG q70", reencode(original, 70)),
+        ("JPEG q50", reencode(original, 50))
+    ]
+    # Only near-exact copies are skipped; a rotated rescan is OCR'd again, which costs time, not accuracy
+    rotated = [("rotated 0.5°", rotate(original, 0.5)), ("rotated -0.3°", rotate(original, -0.3))]
+    
+    started = time.perf_counter()
+    wrongly_merged = [label for label, page in different if merged(original, page)]
+    missed = [label for label, page in copies if not merged(original, page)]
+    comparisons = len(different) + len(copies)
+    print(f"{len(different)} pages with a different amount, {len(copies)} copies "
+          f"({(time.perf_counter() - started) / comparisons * 1000:.0f} ms per pair, fingerprints included)")
+    for label in wrongly_merged:
+        print(f"   ❌ merged although the amount differs: {label}")
+    for label in missed:
+        print(f"   ⚠️ copy not recognized: {label}")
+    for label, page in rotated:
+        print(f"   ℹ️ {label}: {'merged' if merged(original, page) else 'OCR again'}")
+    
+    # Distinct pages of one template all share a hash neighbourhood; each claim must stay cheap
+    index = PageHashIndex()
+    pages = [render_page([f"{rng.randint(10, 999)}.00" for _ in range(rows)]) for _ in range(pages_per_document)]
+    started = time.perf_counter()
+    merged_distinct = sum(index.claim(page_no, page)[0] is not None for page_no, page in enumerate(pages, 1))
+    per_claim_ms = (time.perf_counter() - started) / len(pages) * 1000
+    print(f"{len(pages)} distinct same-template pages: {per_claim_ms:.1f} ms per claim, {merged_distinct} merged")
+    
+    assert not wrongly_merged, f"{len(wrongly_merged)} pages with different amounts were merged"
+    assert not missed, f"{len(missed)} copies were not merged"
+    assert not merged_distinct, f"{merged_distinct} distinct pages were merged"
+    assert per_claim_ms < max_claim_ms, f"claims took {per_claim_ms:.1f} ms each (limit {max_claim_ms} ms)"
+    print("✅ All checks passed")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check page dedup against same-template pages and real copies")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the template's amounts")
+    args = parser.parse_args()
+    try:
+        run_check(seed=args.seed)
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
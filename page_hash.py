@@ -0,0 +1,69 @@
+import threading
+from PIL import Image, ImageChops, ImageOps
+from config import Config
+
+def page_fingerprint(image, width=400, hash_size=16):
+    """Difference hash plus a grayscale thumbnail of the page's inked area"""
+    gray = image.convert('L')
+    # Cropping to the ink makes the fingerprint insensitive to scan offsets
+    box = ImageOps.invert(gray).point(lambda v: 255 if v > 64 else 0).getbbox()
+    if box:
+        gray = gray.crop(box)
+    
+    # At 400px a 200 DPI digit is still ~7px tall, so a changed amount moves some pixel by
+    # 100+ gray levels while a JPEG re-encode of the same page moves none by more than ~10
+    thumb = gray.resize((width, int(width * 1.414)), Image.BILINEAR)
+    
+    pixels = list(thumb.resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    
+    return {'hash': bits, 'thumb': thumb}
+
+def max_difference(thumb_a, thumb_b):
+    """Largest per-pixel gray difference between two thumbnails"""
+    return ImageChops.difference(thumb_a, thumb_b).getextrema()[1]
+
+class PageHashIndex:
+    """Per-document registry so identical pages (repeated pages, re-encodes) reuse the first copy's OCR"""
+    
+    def __init__(self, max_hash_distance=None, max_difference=None, max_candidates=None):
+        self.max_hash_distance = max_hash_distance if max_hash_distance is not None else Config.PAGE_DEDUP_MAX_HASH_DISTANCE
+        self.max_difference = max_difference if max_difference is not None else Config.PAGE_DEDUP_MAX_DIFFERENCE
+        self.max_candidates = max_candidates if max_candidates is not None else Config.PAGE_DEDUP_MAX_CANDIDATES
+        self._entries = []
+        self._lock = threading.Lock()
+    
+    def claim(self, page_no, image):
+        """Return (original, None) for a duplicate, else (None, entry) to publish later"""
+        fingerprint = page_fingerprint(image)
+        
+        # Only near-exact copies are skipped: pages of one bill share a template, so anything
+        # looser would merge pages that differ in an amount. Rotated rescans are simply OCR'd.
+        with self._lock:
+            distances = [((fingerprint['hash'] ^ entry['hash']).bit_count(), order) for order, entry in enumerate(self._entries)]
+            candidates = sorted(item for item in distances if item[0] <= self.max_hash_distance)
+            # A hard cap keeps a long document of same-template pages linear, not quadratic
+            for _, order in candidates[:self.max_candidates]:
+                entry = self._entries[order]
+                if entry['thumb'].size == fingerprint['thumb'].size and \
+                        max_difference(fingerprint['thumb'], entry['thumb']) <= self.max_difference:
+                    return entry, None
+            
+            entry = dict(fingerprint, page_no=page_no, result=None, done=threading.Event())
+            self._entries.append(entry)
+        return None, entry
+    
+    def publish(self, entry, result):
+        """Make a page's OCR result (None on failure) available to its duplicates"""
+        entry['result'] = result
+        entry['done'].set()
+    
+    def wait(self, entry, deadline=None):
+        timeout = deadline.remaining() if deadline else None
+        entry['done'].wait(timeout)
+        return entry['result']
@@ -0,0 +1,335 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from config import Config
+from structured_logging import get_logger
+
+logger = get_logger('page_queue')
+
+# How often each worker looks for abandoned jobs
+PURGE_INTERVAL_SECONDS = 60
+
+class PageQueue:
+    """Queue of page-level OCR tasks; backends share this interface"""
+    
+    def submit_job(self, content, file_type, pages, options):
+        """Publish one task per page and return the job id"""
+        raise NotImplementedError
+    
+    def claim(self, worker_id):
+        """Lease the next queued task, or return None when there is nothing to do"""
+        raise NotImplementedError
+    
+    def complete(self, task_id, result):
+        raise NotImplementedError
+    
+    def fail(self, task_id, error):
+        raise NotImplementedError
+    
+    def wait_for_page(self, job_id, page_no, timeout=None):
+        """Block until a page is done or failed; None on timeout"""
+        raise NotImplementedError
+    
+    def delete_job(self, job_id):
+        raise NotImplementedError
+    
+    def purge_expired(self):
+        """Delete jobs older than the TTL with their tasks, e.g. left by a web process that died; returns how many"""
+        raise NotImplementedError
+
+class InMemoryPageQueue(PageQueue):
+    """In-process backend, served by worker threads of the same process"""
+    
+    def __init__(self, lease_seconds=None, max_attempts=None, job_ttl_seconds=None):
+        self.lease_seconds = lease_seconds or Config.PAGE_QUEUE_LEASE_SECONDS
+        self.max_attempts = max_attempts or Config.PAGE_QUEUE_MAX_ATTEMPTS
+        self.job_ttl_seconds = job_ttl_seconds or Config.PAGE_QUEUE_JOB_TTL_SECONDS
+        self._jobs = {}
+        self._tasks = {}
+        self._condition = threading.Condition()
+    
+    def submit_job(self, content, file_type, pages, options):
+        job_id = uuid.uuid4().hex
+        with self._condition:
+            self._jobs[job_id] = {'content': content, 'file_type': file_type, 'options': options, 'created_at': time.monotonic()}
+            for page_no in pages:
+                task_id = f"{job_id}:{page_no}"
+                self._tasks[task_id] = {
+                    'task_id': task_id,
+                    'job_id': job_id,
+                    'page_no': page_no,
+                    'status': 'queued',
+                    'attempts': 0,
+                    'claimed_at': None,
+                    'result': None,
+                    'error': None
+                }
+            self._condition.notify_all()
+        return job_id
+    
+    def claim(self, worker_id):
+        now = time.monotonic()
+        with self._condition:
+            for task in self._tasks.values():
+                lease_expired = task['status'] == 'running' and now - task['claimed_at'] > self.lease_seconds
+                if lease_expired and task['attempts'] >= self.max_attempts:
+                    # The page crashed or hung its worker every time; stop handing it out
+                    task.update(status='failed', error=_lease_error(task['attempts']))
+                    self._condition.notify_all()
+                    continue
+                if task['status'] == 'queued' or lease_expired:
+                    task['status'] = 'running'
+                    task['claimed_at'] = now
+                    task['attempts'] += 1
+                    job = self._jobs[task['job_id']]
+                    return dict(job, task_id=task['task_id'], job_id=task['job_id'], page_no=task['page_no'])
+        return None
+    
+    def complete(self, task_id, result):
+        self._finish(task_id, 'done', result=result)
+    
+    def fail(self, task_id, error):
+        with self._condition:
+            task = self._tasks.get(task_id)
+            if task is not None and task['attempts'] < self.max_attempts:
+                task['status'] = 'queued'
+                return
+        self._finish(task_id, 'failed', error=error)
+    
+    def wait_for_page(self, job_id, page_no, timeout=None):
+        task_id = f"{job_id}:{page_no}"
+        with self._condition:
+            done = self._condition.wait_for(
+                lambda: self._tasks.get(task_id, {}).get('status') in ('done', 'failed'), timeout
+            )
+            if not done:
+                return None
+            task = self._tasks[task_id]
+            return {'status': task['status'], 'result': task['result'], 'error': task['error']}
+    
+    def delete_job(self, job_id):
+        with self._condition:
+            self._jobs.pop(job_id, None)
+            for task_id in [t for t, task in self._tasks.items() if task['job_id'] == job_id]:
+                del self._tasks[task_id]
+    
+    def purge_expired(self):
+        cutoff = time.monotonic() - self.job_ttl_seconds
+        with self._condition:
+            expired = [job_id for job_id, job in self._jobs.items() if job['created_at'] < cutoff]
+            for job_id in expired:
+                self.delete_job(job_id)
+        return len(expired)
+    
+    def _finish(self, task_id, status, result=None, error=None):
+        with self._condition:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            task.update(status=status, result=result, error=error)
+            self._condition.notify_all()
+
+class SQLitePageQueue(PageQueue):
+    """SQLite-backed queue shared by the web workers and page_worker.py processes of one host"""
+    
+    def __init__(self, path, lease_seconds=None, max_attempts=None, poll_interval=None, job_ttl_seconds=None):
+        self.path = path
+        self.lease_seconds = lease_seconds or Config.PAGE_QUEUE_LEASE_SECONDS
+        self.max_attempts = max_attempts or Config.PAGE_QUEUE_MAX_ATTEMPTS
+        self.job_ttl_seconds = job_ttl_seconds or Config.PAGE_QUEUE_JOB_TTL_SECONDS
+        self.poll_interval = poll_interval or Config.PAGE_QUEUE_POLL_INTERVAL
+        self._local = threading.local()
+        
+        self._connection().executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                file_type TEXT NOT NULL,
+                options TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                page_no INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_at REAL,
+                worker_id TEXT,
+                result TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, claimed_at);
+            CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id, page_no);
+        ''')
+    
+    def _connection(self):
+        # One connection per thread; WAL lets readers poll while a worker writes. WAL coordinates
+        # through shared memory, so every process must be on this host and the file on a local
+        # disk: on NFS/SMB/EFS locking is unreliable and the queue can corrupt
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+    
+    def _connect(self):
+        return _Transaction(self._connection())
+    
+    def submit_job(self, content, file_type, pages, options):
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs VALUES (?, ?, ?, ?, ?)',
+                (job_id, content, file_type, json.dumps(options), time.time())
+            )
+            conn.executemany(
+                "INSERT INTO tasks (task_id, job_id, page_no, status) VALUES (?, ?, ?, 'queued')",
+                [(f"{job_id}:{page_no}", job_id, page_no) for page_no in pages]
+            )
+        return job_id
+    
+    def claim(self, worker_id):
+        now = time.time()
+        with self._connect() as conn:
+            # A page whose every attempt crashed or hung its worker is failed, not retried forever
+            conn.execute(
+                """UPDATE tasks SET status = 'failed', error = ?
+                   WHERE status = 'running' AND claimed_at < ? AND attempts >= ?""",
+                (_lease_error(self.max_attempts), now - self.lease_seconds, self.max_attempts)
+            )
+            row = conn.execute(
+                """SELECT task_id FROM tasks
+                   WHERE status = 'queued' OR (status = 'running' AND claimed_at < ?)
+                   ORDER BY rowid LIMIT 1""",
+                (now - self.lease_seconds,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            conn.execute(
+                """UPDATE tasks SET status = 'running', claimed_at = ?, worker_id = ?,
+                   attempts = attempts + 1 WHERE task_id = ?""",
+                (now, worker_id, row['task_id'])
+            )
+            task = conn.execute(
+                """SELECT t.task_id, t.job_id, t.page_no, j.content, j.file_type, j.options
+                   FROM tasks t JOIN jobs j ON j.job_id = t.job_id WHERE t.task_id = ?""",
+                (row['task_id'],)
+            ).fetchone()
+        
+        return {
+            'task_id': task['task_id'],
+            'job_id': task['job_id'],
+            'page_no': task['page_no'],
+            'content': bytes(task['content']),
+            'file_type': task['file_type'],
+            'options': json.loads(task['options'])
+        }
+    
+    def complete(self, task_id, result):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'done', result = ? WHERE task_id = ?",
+                (json.dumps(result), task_id)
+            )
+    
+    def fail(self, task_id, error):
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE tasks SET error = ?,
+                   status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END
+                   WHERE task_id = ?""",
+                (error, self.max_attempts, task_id)
+            )
+    
+    def wait_for_page(self, job_id, page_no, timeout=None):
+        give_up_at = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            # A plain autocommit read: under WAL it never takes the write lock workers need to claim and complete
+            row = self._connection().execute(
+                'SELECT status, result, error FROM tasks WHERE task_id = ?',
+                (f"{job_id}:{page_no}",)
+            ).fetchone()
+            if row is not None and row['status'] in ('done', 'failed'):
+                return {
+                    'status': row['status'],
+                    'result': json.loads(row['result']) if row['result'] else None,
+                    'error': row['error']
+                }
+            if give_up_at is not None and time.monotonic() >= give_up_at:
+                return None
+            time.sleep(self.poll_interval)
+    
+    def delete_job(self, job_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM tasks WHERE job_id = ?', (job_id,))
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+    
+    def purge_expired(self):
+        cutoff = time.time() - self.job_ttl_seconds
+        with self._connect() as conn:
+            conn.execute('DELETE FROM tasks WHERE job_id IN (SELECT job_id FROM jobs WHERE created_at < ?)', (cutoff,))
+            return conn.execute('DELETE FROM jobs WHERE created_at < ?', (cutoff,)).rowcount
+
+def _lease_error(attempts):
+    return f"Lease expired on each of {attempts} attempts"
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT around a block, so claims never race"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+def create_page_queue(url):
+    """Build a queue from a URL: memory:// or sqlite:///path/to/queue.db"""
+    if url.startswith('memory://'):
+        return InMemoryPageQueue()
+    if url.startswith('sqlite:///'):
+        return SQLitePageQueue(url[len('sqlite:///'):])
+    raise Exception(f"Unsupported page queue URL: {url}")
+
+def run_worker(queue, handler, worker_id=None, stop_event=None, idle_sleep=None):
+    """Claim tasks and run handler(task) until stop_event is set"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    idle_sleep = idle_sleep or Config.PAGE_QUEUE_POLL_INTERVAL
+    stop_event = stop_event or threading.Event()
+    
+    backoff = idle_sleep
+    next_purge = time.monotonic()
+    while not stop_event.is_set():
+        try:
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+                purged = queue.purge_expired()
+                if purged:
+                    logger.warning("purged abandoned page jobs", extra={'fields': {'jobs': purged}})
+            
+            task = queue.claim(worker_id)
+            if task is None:
+                stop_event.wait(idle_sleep)
+                continue
+            
+            try:
+                queue.complete(task['task_id'], handler(task))
+            except Exception as e:
+                queue.fail(task['task_id'], str(e))
+            backoff = idle_sleep
+        except Exception as e:
+            # The queue itself failed (e.g. "database is locked"); a lost update is retried once the lease expires
+            logger.error("page queue error", extra={'fields': {'worker_id': worker_id, 'error': str(e), 'retry_in': backoff}})
+            stop_event.wait(backoff)
+            backoff = min(backoff * 2, 30)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+OCR worker for the page queue; with the SQLite backend, run it on the same host as the web service
+"""
+import argparse
+import threading
+from config import Config
+from page_queue import create_page_queue, run_worker
+from utils import process_page_task
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued OCR page tasks")
+    parser.add_argument('--queue', default=Config.PAGE_QUEUE_URL,
+                        help="Queue URL, e.g. sqlite:////var/lib/bill-extraction/page_queue.db on a local disk (default: PAGE_QUEUE_URL)")
+    parser.add_argument('--threads', type=int, default=1, help="Pages processed concurrently")
+    args = parser.parse_args()
+    
+    if not args.queue:
+        parser.error("No queue configured; pass --queue or set PAGE_QUEUE_URL")
+    
+    queue = create_page_queue(args.queue)
+    stop_event = threading.Event()
+    threads = [
+        threading.Thread(target=run_worker, args=(queue, process_page_task), kwargs={'stop_event': stop_event})
+        for _ in range(args.threads)
+    ]
+    
+    print(f"🚀 Page worker started: {args.threads} thread(s) on {args.queue}")
+    for thread in threads:
+        thread.start()
+    
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        print("🛑 Stopping page worker...")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import cProfile
+import hmac
+import io
+import marshal
+import pstats
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from config import Config
+
+class RequestProfiler:
+    """Opt-in cProfile of single requests, one at a time, kept in a bounded in-memory store by request id"""
+    
+    def __init__(self, sample_rate=None, token=None, max_profiles=None, top_n=None):
+        self.sample_rate = sample_rate if sample_rate is not None else Config.PROFILE_SAMPLE_RATE
+        self.token = token if token is not None else Config.PROFILE_TOKEN
+        self.max_profiles = max_profiles or Config.PROFILE_MAX_STORED
+        self.top_n = top_n or Config.PROFILE_TOP_N
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+    
+    @property
+    def enabled(self):
+        # Without a token nobody could read the profiles back, so never collect them
+        return bool(self.token)
+    
+    def authorized(self, supplied):
+        return self.enabled and bool(supplied) and hmac.compare_digest(supplied, self.token)
+    
+    def should_profile(self, headers):
+        """Profile when the client sends the token in X-Profile, or when the request is sampled"""
+        if not self.enabled:
+            return False
+        if self.authorized(headers.get('X-Profile')):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+    
+    def maybe_profile(self, request_id, triggered, **details):
+        """The profiler context when triggered, else a no-op context"""
+        return self.profile(request_id, **details) if triggered else nullcontext()
+    
+    @contextmanager
+    def profile(self, request_id, **details):
+        # Only one profile at a time: on Python 3.12+ cProfile is process-wide (it sees every
+        # thread, including other requests and OCR workers) and a second enable() raises
+        started = time.time()
+        profiler, reason = None, "another request was being profiled"
+        if self._active.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Some other tool (a debugger, coverage) holds the profiling hook
+                profiler, reason = None, str(e)
+                self._active.release()
+        
+        if profiler is None:
+            self._store_skipped(request_id, started, details, reason)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._active.release()
+            self._store(request_id, profiler, started, details)
+    
+    def _store(self, request_id, profiler, started, details):
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        stats.sort_stats('cumulative').print_stats(self.top_n)
+        
+        entry = {
+            'request_id': request_id,
+            'started_at': started,
+            'duration_seconds': round(time.time() - started, 3),
+            'details': details,
+            'report': text.getvalue(),
+            # Same format as pstats dump_stats(), loadable by snakeviz or pstats.Stats
+            'raw': marshal.dumps(stats.stats)
+        }
+        self._save(entry)
+    
+    def _store_skipped(self, request_id, started, details, reason):
+        # Still stored, so the X-Profile-Id the client got back explains itself
+        self._save({
+            'request_id': request_id,
+            'started_at': started,
+            'duration_seconds': 0.0,
+            'details': dict(details, skipped=reason),
+            'report': f"Not profiled: {reason}\n",
+            'raw': marshal.dumps({})
+        })
+    
+    def _save(self, entry):
+        request_id = entry['request_id']
+        with self._lock:
+            self._profiles.pop(request_id, None)
+            self._profiles[request_id] = entry
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+    
+    def get(self, request_id):
+        with self._lock:
+            return self._profiles.get(request_id)
+    
+    def list(self):
+        with self._lock:
+            return [
+                {key: entry[key] for key in ('request_id', 'started_at', 'duration_seconds', 'details')}
+                for entry in reversed(self._profiles.values())
+            ]
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Replay captured /extract-bill-data traffic against a local server and report latency
+"""
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from config import Config
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def start_document_server(directory, port=0):
+    """Serve captured documents over HTTP in place of the original document hosts"""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def load_captures(path, document_base_url=None, disable_cache=False):
+    """Request payloads from a capture file, pointing stored documents at the local server"""
+    payloads = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            payload = dict(entry['payload'] or {})
+            if entry.get('document_ref') and document_base_url:
+                payload['document'] = f"{document_base_url}/{entry['document_ref']}"
+            if not payload.get('document'):
+                # Inline document that was not stored; nothing to replay
+                continue
+            if disable_cache:
+                payload['cache'] = False
+            payloads.append(payload)
+    return payloads
+
+def _send(session, target, payload, scheduled_at):
+    """POST one payload; latency counts from the scheduled send time, not the actual one"""
+    try:
+        response = session.post(f"{target}/extract-bill-data", json=payload, timeout=Config.REQUEST_DEADLINE_MAX_SECONDS + 30)
+        response.content
+        status = response.status_code
+        error = None
+    except Exception as e:
+        status = None
+        error = type(e).__name__
+    return {'latency': time.perf_counter() - scheduled_at, 'status': status, 'error': error}
+
+_sessions = threading.local()
+
+def _session():
+    if not hasattr(_sessions, 'session'):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+def run_closed_loop(target, payloads, concurrency, total):
+    """Keep exactly `concurrency` requests in flight"""
+    results = []
+    lock = threading.Lock()
+    next_index = iter(range(total))
+    
+    def worker():
+        for index in next_index:
+            result = _send(_session(), target, payloads[index % len(payloads)], time.perf_counter())
+            with lock:
+                results.append(result)
+    
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def run_open_loop(target, payloads, rate, total, max_in_flight=256):
+    """Send at a fixed arrival rate regardless of how fast the server answers"""
+    started = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for index in range(total):
+            scheduled_at = started + index / rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # Measuring from the schedule keeps queueing delay in the numbers
+            futures.append(executor.submit(
+                lambda payload, at: _send(_session(), target, payload, at),
+                payloads[index % len(payloads)], scheduled_at
+            ))
+        return [future.result() for future in futures]
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index] * 1000, 1)
+
+def summarize(results, elapsed):
+    latencies = sorted(r['latency'] for r in results)
+    statuses = Counter(str(r['status'] or r['error']) for r in results)
+    errors = sum(1 for r in results if r['status'] is None or r['status'] >= 400)
+    return {
+        'requests': len(results),
+        'wall_seconds': round(elapsed, 2),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else None,
+        'error_rate': round(errors / len(results), 4) if results else 0,
+        'statuses': dict(statuses),
+        'latency_ms': {
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'p99': _percentile(latencies, 99),
+            'max': round(latencies[-1] * 1000, 1) if latencies else None
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic against a local server")
+    parser.add_argument('capture', nargs='?', default=Config.CAPTURE_FILE, help="Capture JSONL (default: CAPTURE_FILE)")
+    parser.add_argument('--target', default=f"http://localhost:{Config.PORT}", help="Server under test")
+    parser.add_argument('--documents', default=Config.CAPTURE_DOCUMENTS_DIR, help="Directory of captured documents")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', type=int, default=4, help="Closed loop: requests kept in flight")
+    mode.add_argument('--rate', type=float, help="Open loop: requests per second")
+    parser.add_argument('--requests', type=int, default=None, help="Total requests (default: one pass over the capture)")
+    parser.add_argument('--no-cache', action='store_true', help="Send \"cache\": false so every request is processed")
+    parser.add_argument('--output', help="Write the summary as JSON")
+    args = parser.parse_args()
+    
+    server = None
+    base_url = None
+    if os.path.isdir(args.documents):
+        server = start_document_server(args.documents)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    
+    payloads = load_captures(args.capture, base_url, args.no_cache)
+    if not payloads:
+        parser.error(f"No replayable requests in {args.capture}")
+    total = args.requests or len(payloads)
+    
+    print("🔁 TRAFFIC REPLAY")
+    print("=" * 60)
+    print(f"{total} requests from {args.capture} -> {args.target}"
+          f" ({f'{args.rate}/s open loop' if args.rate else f'{args.concurrency} concurrent'})")
+    if base_url:
+        print(f"📂 Serving {args.documents} at {base_url}")
+    
+    started = time.perf_counter()
+    if args.rate:
+        results = run_open_loop(args.target, payloads, args.rate, total)
+    else:
+        results = run_closed_loop(args.target, payloads, args.concurrency, total)
+    summary = summarize(results, time.perf_counter() - started)
+    
+    if server:
+        server.shutdown()
+    
+    latency = summary['latency_ms']
+    print(f"📊 Throughput: {summary['throughput_rps']} req/s over {summary['wall_seconds']}s")
+    print(f"⏱️ Latency: p50 {latency['p50']} ms | p95 {latency['p95']} ms | p99 {latency['p99']} ms | max {latency['max']} ms")
+    print(f"❌ Error rate: {summary['error_rate'] * 100:.2f}% {summary['statuses']}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
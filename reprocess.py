@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Re-run parse/enhance/validate on stored OCR text after the parser rules change
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from bill_processor import BillProcessor
+from extraction_store import create_extraction_store
+from config import Config
+
+# Per-process store connection and parser, set up once by _init_worker
+_worker = {}
+
+# Finished jobs kept for GET /reprocess/<job_id>
+MAX_STORED_JOBS = 20
+
+def _init_worker(store_url):
+    _worker['store'] = create_extraction_store(store_url)
+    _worker['processor'] = BillProcessor()
+
+def reprocess_entry(store, processor, key, force=False):
+    """Re-parse one stored document; returns 'updated', 'skipped' or 'missing'"""
+    entry = store.get(key)
+    if entry is None:
+        return 'missing'
+    if entry['parser_version'] == processor.PARSER_VERSION and not force:
+        return 'skipped'
+    
+    data, token_usage = processor.extract_bill_data(entry['pages'])
+    result = dict(entry['result'], data=data, token_usage=token_usage)
+    store.update_result(key, processor.PARSER_VERSION, result)
+    return 'updated'
+
+def _reprocess_in_worker(key, force):
+    try:
+        return key, reprocess_entry(_worker['store'], _worker['processor'], key, force), None
+    except Exception as e:
+        return key, 'failed', str(e)
+
+def reprocess_backlog(store_url, keys=None, force=False, limit=None, workers=None):
+    """Re-parse stored documents from another parser version (every document with force) in parallel"""
+    workers = workers or Config.REPROCESS_WORKERS
+    store = create_extraction_store(store_url)
+    version = BillProcessor.PARSER_VERSION
+    if keys is None:
+        keys = store.all_keys(limit) if force else store.stale_keys(version, limit)
+    
+    started = time.perf_counter()
+    if workers <= 1 or len(keys) <= 1:
+        _init_worker(store_url)
+        outcomes = [_reprocess_in_worker(key, force) for key in keys]
+    else:
+        # Parsing is pure Python, so processes rather than threads; each opens its own connection.
+        # Spawned, not forked: POST /reprocess runs this inside a threaded web worker, and a fork
+        # can copy a lock some other thread holds (logging, SQLite) into the child
+        chunksize = max(1, len(keys) // (workers * 4))
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(store_url,)
+        ) as executor:
+            outcomes = list(executor.map(_reprocess_in_worker, keys, repeat(force), chunksize=chunksize))
+    elapsed = time.perf_counter() - started
+    
+    counts = Counter(outcome for _, outcome, _ in outcomes)
+    remaining = sum(entries for entry_version, entries in store.stats().items() if entry_version != version)
+    return {
+        'parser_version': version,
+        'selected': len(keys),
+        'updated': counts['updated'],
+        'skipped': counts['skipped'],
+        'missing': counts['missing'],
+        'failed': counts['failed'],
+        'errors': {key: error for key, outcome, error in outcomes if outcome == 'failed'},
+        'remaining': remaining,
+        'seconds': round(elapsed, 2)
+    }
+
+class ReprocessJobs:
+    """Runs POST /reprocess batches one at a time on a background thread, off the request threads"""
+    
+    def __init__(self, store_url, max_jobs=MAX_STORED_JOBS):
+        self.store_url = store_url
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reprocess')
+    
+    def submit(self, keys=None, force=False, limit=None):
+        """Queue a batch; returns (job, created), where an unfinished job is returned instead of queueing another"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job['status'] in ('queued', 'running'):
+                    return dict(job), False
+            
+            job = {'job_id': uuid.uuid4().hex, 'status': 'queued', 'created_at': time.time(), 'summary': None, 'error': None}
+            self._jobs[job['job_id']] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            queued = dict(job)
+        self._executor.submit(self._run, job, keys, force, limit)
+        return queued, True
+    
+    def _run(self, job, keys, force, limit):
+        with self._lock:
+            job['status'] = 'running'
+        try:
+            summary = reprocess_backlog(self.store_url, keys, force=force, limit=limit)
+            update = {'status': 'done', 'summary': summary}
+        except Exception as e:
+            update = {'status': 'failed', 'error': str(e)}
+        with self._lock:
+            job.update(update, finished_at=time.time())
+    
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse stored OCR text with the current parser version")
+    parser.add_argument('--store', default=Config.EXTRACTION_STORE_URL, help="Store URL (default: EXTRACTION_STORE_URL)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Parallel worker processes")
+    parser.add_argument('--key', action='append', dest='keys', help="Only this document key (repeatable)")
+    parser.add_argument('--limit', type=int, help="At most this many documents")
+    parser.add_argument('--force', action='store_true', help="Re-parse even when the parser version matches")
+    parser.add_argument('--output', help="Write the summary as JSON")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("No store configured; pass --store sqlite:///path.db or set EXTRACTION_STORE_URL")
+    
+    print("♻️ REPROCESS STORED EXTRACTIONS")
+    print("=" * 60)
+    print(f"Parser version: {BillProcessor.PARSER_VERSION} | {args.workers} workers | {args.store}")
+    
+    try:
+        summary = reprocess_backlog(args.store, args.keys, args.force, args.limit, args.workers)
+    except Exception as e:
+        print(f"❌ Reprocessing failed: {e}")
+        sys.exit(1)
+    
+    rate = summary['selected'] / summary['seconds'] if summary['seconds'] else 0
+    print(f"✅ Updated {summary['updated']} | ⏭️ skipped {summary['skipped']} | ❌ failed {summary['failed']}"
+          f" | missing {summary['missing']}")
+    print(f"⏱️ {summary['selected']} documents in {summary['seconds']}s ({rate:.1f}/s), {summary['remaining']} still on older versions")
+    for key, error in list(summary['errors'].items())[:10]:
+        print(f"   ❌ {key}: {error}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if summary['failed']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
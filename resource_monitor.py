@@ -0,0 +1,196 @@
+import contextvars
+import os
+import resource
+import signal
+import sys
+import threading
+import time
+from config import Config
+
+_request_resources = contextvars.ContextVar('request_resources', default=None)
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_MB = 1024 * 1024
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # No procfs: fall back to the lifetime peak (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def snapshot():
+    """RSS and live Python allocation count, for before/after deltas around a stage"""
+    return current_rss(), sys.getallocatedblocks()
+
+class RequestResources:
+    """Peak RSS and per-stage memory deltas for one request (process-wide RSS, so concurrent requests overlap)"""
+    
+    def __init__(self, rss):
+        self.start_rss = rss
+        self.peak_rss = rss
+        self.cost = None
+        self._stages = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, rss):
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+    
+    def add_stage(self, stage, before, after):
+        self.observe(after[0])
+        with self._lock:
+            totals = self._stages.setdefault(stage, {'rss_delta': 0, 'allocated_blocks': 0})
+            totals['rss_delta'] += after[0] - before[0]
+            totals['allocated_blocks'] += after[1] - before[1]
+    
+    @property
+    def peak_growth(self):
+        return self.peak_rss - self.start_rss
+    
+    def stages(self):
+        with self._lock:
+            return {stage: dict(totals) for stage, totals in self._stages.items()}
+    
+    def to_dict(self):
+        return {
+            'start_rss_mb': round(self.start_rss / _MB, 1),
+            'peak_rss_mb': round(self.peak_rss / _MB, 1),
+            'peak_growth_mb': round(self.peak_growth / _MB, 1),
+            'stages': {
+                stage: {
+                    'rss_delta_mb': round(totals['rss_delta'] / _MB, 2),
+                    'allocated_blocks': totals['allocated_blocks']
+                }
+                for stage, totals in self.stages().items()
+            }
+        }
+
+class ResourceMonitor:
+    """Samples this worker's RSS for active requests, aggregates metrics and recycles the worker above a watermark"""
+    
+    def __init__(self, watermark_mb=None, sample_interval=None):
+        watermark_mb = watermark_mb if watermark_mb is not None else Config.WORKER_MEMORY_WATERMARK_MB
+        self.watermark = watermark_mb * _MB
+        self.sample_interval = sample_interval or Config.RESOURCE_SAMPLE_INTERVAL
+        self.recycle_requested = False
+        self._active = set()
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._requests = 0
+        self._max_rss = 0
+        self._peak_growth_total = 0
+        self._peak_growth_max = 0
+        self._bytes_per_cost = None
+        self._stages = {}
+    
+    def start_request(self):
+        """Begin accounting for the request running in this context"""
+        resources = RequestResources(current_rss())
+        with self._lock:
+            self._active.add(resources)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+                self._sampler.start()
+        _request_resources.set(resources)
+        return resources
+    
+    def finish_request(self, resources):
+        """Fold a finished request into the metrics, then recycle if the worker is over its watermark"""
+        resources.observe(current_rss())
+        with self._lock:
+            self._active.discard(resources)
+            self._requests += 1
+            self._max_rss = max(self._max_rss, resources.peak_rss)
+            self._peak_growth_total += resources.peak_growth
+            self._peak_growth_max = max(self._peak_growth_max, resources.peak_growth)
+            if resources.cost:
+                # Moving average of peak growth per admission cost unit, for memory-aware admission
+                sample = max(0, resources.peak_growth) / resources.cost
+                self._bytes_per_cost = sample if self._bytes_per_cost is None else 0.8 * self._bytes_per_cost + 0.2 * sample
+            for stage, totals in resources.stages().items():
+                aggregate = self._stages.setdefault(stage, {'count': 0, 'rss_delta': 0, 'rss_delta_max': 0, 'allocated_blocks': 0})
+                aggregate['count'] += 1
+                aggregate['rss_delta'] += totals['rss_delta']
+                aggregate['rss_delta_max'] = max(aggregate['rss_delta_max'], totals['rss_delta'])
+                aggregate['allocated_blocks'] += totals['allocated_blocks']
+        
+        if self.over_watermark():
+            self.request_recycle()
+    
+    def over_watermark(self, rss=None):
+        return bool(self.watermark) and (rss if rss is not None else current_rss()) > self.watermark
+    
+    def projected_growth(self, cost):
+        """Expected peak memory growth of a request of this cost, from past measurements"""
+        with self._lock:
+            return (self._bytes_per_cost or 0) * cost
+    
+    def admits(self, cost, in_flight_cost=0):
+        """Whether a new request fits under the watermark next to the cost already running"""
+        if not self.watermark:
+            return True
+        if self.recycle_requested:
+            return False
+        # Conservative: in-flight requests may already be part of the current RSS
+        return current_rss() + self.projected_growth(cost + in_flight_cost) <= self.watermark
+    
+    def request_recycle(self):
+        """Ask gunicorn to replace this worker; SIGTERM lets in-flight requests finish first"""
+        with self._lock:
+            if self.recycle_requested:
+                return
+            self.recycle_requested = True
+        
+        from structured_logging import get_logger
+        logger = get_logger('resource_monitor')
+        fields = {'rss_mb': round(current_rss() / _MB, 1), 'watermark_mb': round(self.watermark / _MB, 1)}
+        if 'gunicorn' not in os.environ.get('SERVER_SOFTWARE', ''):
+            logger.warning("memory watermark exceeded; not running under gunicorn, so not recycling", extra={'fields': fields})
+            return
+        logger.warning("memory watermark exceeded; recycling worker", extra={'fields': fields})
+        os.kill(os.getpid(), signal.SIGTERM)
+    
+    def metrics(self):
+        rss = current_rss()
+        with self._lock:
+            requests = self._requests
+            return {
+                'rss_mb': round(rss / _MB, 1),
+                'max_request_peak_rss_mb': round(max(self._max_rss, rss) / _MB, 1),
+                'watermark_mb': round(self.watermark / _MB, 1) if self.watermark else None,
+                'recycle_requested': self.recycle_requested,
+                'active_requests': len(self._active),
+                'requests_measured': requests,
+                'request_peak_growth_mb': {
+                    'avg': round(self._peak_growth_total / requests / _MB, 2) if requests else 0,
+                    'max': round(self._peak_growth_max / _MB, 2)
+                },
+                'mb_per_cost_unit': round(self._bytes_per_cost / _MB, 2) if self._bytes_per_cost is not None else None,
+                'stages': {
+                    stage: {
+                        'count': aggregate['count'],
+                        'rss_delta_mb_avg': round(aggregate['rss_delta'] / aggregate['count'] / _MB, 2),
+                        'rss_delta_mb_max': round(aggregate['rss_delta_max'] / _MB, 2),
+                        'allocated_blocks_avg': round(aggregate['allocated_blocks'] / aggregate['count'])
+                    }
+                    for stage, aggregate in self._stages.items()
+                }
+            }
+    
+    def _sample_loop(self):
+        # Catches peaks inside a stage (e.g. a page's rasterized bitmap) that end-of-stage snapshots miss
+        while True:
+            time.sleep(self.sample_interval)
+            rss = current_rss()
+            with self._lock:
+                active = list(self._active)
+            for resources in active:
+                resources.observe(rss)
+
+def current_request_resources():
+    return _request_resources.get()
+
+resource_monitor = ResourceMonitor()
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+
+class ResultCache:
+    """LRU cache of extraction results keyed by document URL, with TTL and size limits"""
+    
+    def __init__(self, ttl_seconds=None, max_entries=None, max_bytes=None):
+        self.ttl_seconds = ttl_seconds or Config.RESULT_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or Config.RESULT_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or Config.RESULT_CACHE_MAX_BYTES
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(url, **options):
+        """Only remote URLs are cacheable; options that change the result are part of the key"""
+        if not url.startswith(('http://', 'https://')):
+            return None
+        return json.dumps([url, options], sort_keys=True)
+    
+    @staticmethod
+    def content_hash(content):
+        return hashlib.sha256(content).hexdigest()
+    
+    def get(self, key):
+        """Return a live entry (validators, content hash, file type, result) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry['stored_at'] > self.ttl_seconds:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+    
+    def put(self, key, result, content_hash, etag=None, last_modified=None, file_type=None):
+        size = len(json.dumps(result))
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                'result': result,
+                'content_hash': content_hash,
+                'file_type': file_type,
+                'etag': etag,
+                'last_modified': last_modified,
+                'stored_at': time.monotonic(),
+                'size': size
+            }
+            self._bytes += size
+            
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+    
+    def revalidated(self, key, etag=None, last_modified=None):
+        """Record a successful revalidation: refresh validators and restart the TTL"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['etag'] = etag or entry['etag']
+            entry['last_modified'] = last_modified or entry['last_modified']
+            entry['stored_at'] = time.monotonic()
+            self.hits += 1
+    
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+    
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['size']
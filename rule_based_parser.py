@@ -1,6 +1,11 @@
 import re
+from config import Config
+from linear_parser import parse_item_line
 
 class RuleBasedBillParser:
+    # Bump whenever parsing rules change the output, so stored OCR text gets re-parsed
+    VERSION = 1
+    
     def __init__(self):
         self.total_patterns = [
             r'(?i)total[\s:]*[\$]?\s*(\d+[.,]?\d*\.?\d{2})',
@@ -37,6 +42,15 @@ class RuleBasedBillParser:
         return items
 
     def _parse_line(self, line):
+        if Config.LINE_PARSER_MODE != 'regex':
+            return parse_item_line(line)
+        
+        # The regexes backtrack heavily on long garbage lines, so only short lines reach them
+        if len(line) > Config.LINE_PARSER_MAX_LINE_LENGTH:
+            return None
+        return self._parse_line_regex(line)
+    
+    def _parse_line_regex(self, line):
         # Pattern 1: Simple item with amount
         pattern1 = r'^([A-Za-z][A-Za-z\s\-\&]+?)\s+[\$]?\s*(\d+\.?\d{2})\s*$'
         match = re.search(pattern1, line)
@@ -61,22 +75,53 @@ class RuleBasedBillParser:
         
         return None
 
+    def rebuild_rows(self, words):
+        """Group OCR word boxes into text rows by vertical overlap, left to right"""
+        rows = []
+        for word in sorted(words, key=lambda w: w['top'] + w['height'] / 2):
+            center = word['top'] + word['height'] / 2
+            if rows and rows[-1]['top'] <= center <= rows[-1]['bottom']:
+                row = rows[-1]
+                row['bottom'] = max(row['bottom'], word['top'] + word['height'])
+            else:
+                row = {'top': word['top'], 'bottom': word['top'] + word['height'], 'words': []}
+                rows.append(row)
+            row['words'].append(word)
+        
+        return [
+            " ".join(w['text'] for w in sorted(row['words'], key=lambda w: w['left']))
+            for row in rows
+        ]
+
+    def parse_page(self, page):
+        text = page['text']
+        if page.get('words'):
+            text = "\n".join(self.rebuild_rows(page['words']))
+        
+        # Layout-mode pages keep their letterhead separately, only for page type
+        page_type = self.detect_page_type(page.get('context_text', '') + "\n" + text)
+        line_items = self.extract_line_items(text)
+        
+        page_data = {
+            'page_no': str(page['page_no']),
+            'page_type': page_type,
+            'bill_items': line_items
+        }
+        if page.get('duplicate_of') is not None:
+            page_data['duplicate_of_page'] = str(page['duplicate_of'])
+        if page.get('orientation'):
+            page_data['rotation_applied'] = page['orientation']['rotation']
+        
+        return page_data
+
     def parse_bill_text(self, pages_data):
         pagewise_items = []
         all_items = []
         
         for page in pages_data:
-            page_type = self.detect_page_type(page['text'])
-            line_items = self.extract_line_items(page['text'])
-            
-            page_data = {
-                'page_no': str(page['page_no']),
-                'page_type': page_type,
-                'bill_items': line_items
-            }
-            
+            page_data = self.parse_page(page)
             pagewise_items.append(page_data)
-            all_items.extend(line_items)
+            all_items.extend(page_data['bill_items'])
         
         return {
             'pagewise_line_items': pagewise_items,
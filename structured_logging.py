@@ -0,0 +1,171 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from config import Config
+from resource_monitor import current_request_resources, snapshot
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+class StageTimings:
+    """Accumulated seconds per pipeline stage for one request, shared with its OCR threads"""
+    
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._stages = {}
+        self._lock = threading.Lock()
+    
+    def add(self, stage, seconds):
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds
+    
+    def to_dict(self):
+        with self._lock:
+            return {stage: round(seconds * 1000, 1) for stage, seconds in self._stages.items()}
+    
+    def elapsed_ms(self):
+        return round((time.monotonic() - self.started_at) * 1000, 1)
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; structured fields go in extra={'fields': {...}}"""
+    
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the request id while still on the request's thread"""
+    
+    def filter(self, record):
+        # Records from queue workers may carry the id of the request that published the task
+        record.request_id = getattr(record, 'request_id', None) or _request_id.get()
+        return True
+
+class SuccessSamplingFilter(logging.Filter):
+    """Keep only a fraction of records marked sampled=True; warnings and errors always pass"""
+    
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not getattr(record, 'sampled', False):
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never block the request path: drop (and count) records when the queue is full"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only merge args here
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_queue_handler = None
+_listener = None
+_configure_lock = threading.Lock()
+
+def configure_logging():
+    """Route the app's loggers through a bounded queue to a single writer thread (idempotent)"""
+    global _queue_handler, _listener
+    with _configure_lock:
+        if _queue_handler is not None:
+            return
+        
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JSONFormatter())
+        
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(RequestContextFilter())
+        _queue_handler.addFilter(SuccessSamplingFilter(Config.LOG_SUCCESS_SAMPLE_RATE))
+        
+        root = logging.getLogger('bill_extraction')
+        root.setLevel(Config.LOG_LEVEL)
+        root.addHandler(_queue_handler)
+        root.propagate = False
+        
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, stream_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f'bill_extraction.{name}')
+
+def dropped_log_count():
+    return _queue_handler.dropped if _queue_handler else 0
+
+def start_request(request_id=None):
+    """Bind a request id (client supplied or new) and a fresh stage timer to this context"""
+    request_id = (request_id or '')[:64] or uuid.uuid4().hex
+    _request_id.set(request_id)
+    _stage_timings.set(StageTimings())
+    return request_id
+
+def current_request_id():
+    return _request_id.get()
+
+def current_stage_timings():
+    return _stage_timings.get()
+
+@contextmanager
+def stage_timer(logger, stage, **fields):
+    """Time a stage (and its memory deltas) into the request's totals; yields the log fields so the block can add results"""
+    started = time.monotonic()
+    resources = current_request_resources()
+    before = snapshot() if resources is not None else None
+    try:
+        yield fields
+    except Exception as e:
+        fields.update(stage=stage, duration_ms=round((time.monotonic() - started) * 1000, 1), error=str(e))
+        # Failures are never sampled away
+        logger.warning("stage failed", extra={'fields': fields})
+        raise
+    finally:
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings.add(stage, time.monotonic() - started)
+        if resources is not None:
+            resources.add_stage(stage, before, snapshot())
+    
+    fields.update(stage=stage, duration_ms=round((time.monotonic() - started) * 1000, 1))
+    logger.info("stage complete", extra={'fields': fields, 'sampled': True})
+
+def submit_in_context(executor, fn, *args):
+    """executor.submit() that carries the request id and stage timer into the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from config import Config
+
+_EXTENSIONS = {'pdf': 'pdf', 'jpg': 'jpg', 'png': 'png', 'tiff': 'tiff', 'webp': 'webp'}
+
+class TrafficRecorder:
+    """Append captured /extract-bill-data requests to a JSONL file from a background writer"""
+    
+    def __init__(self, enabled=None, path=None, documents_dir=None, sample_rate=None, max_pending=1000):
+        self.enabled = enabled if enabled is not None else Config.CAPTURE_ENABLED
+        self.path = path or Config.CAPTURE_FILE
+        self.documents_dir = documents_dir if documents_dir is not None else Config.CAPTURE_DOCUMENTS_DIR
+        self.sample_rate = sample_rate if sample_rate is not None else Config.CAPTURE_SAMPLE_RATE
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._writer = None
+        self._lock = threading.Lock()
+    
+    def should_capture(self):
+        return self.enabled and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+    
+    def record(self, payload, request_id, status, duration_ms, document_content=None, file_type=None, content_hash=None):
+        """Queue one capture; never blocks the request, drops when the writer falls behind"""
+        self._ensure_writer()
+        entry = {
+            'ts': time.time(),
+            'request_id': request_id,
+            'payload': payload,
+            'status': status,
+            'duration_ms': duration_ms
+        }
+        try:
+            self._queue.put_nowait((entry, document_content, file_type, content_hash))
+        except queue.Full:
+            self.dropped += 1
+    
+    def flush(self, timeout=5):
+        """Wait until everything queued so far is on disk"""
+        if self._writer is None:
+            return
+        give_up_at = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < give_up_at:
+            time.sleep(0.01)
+    
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, daemon=True)
+                self._writer.start()
+    
+    def _run(self):
+        while True:
+            entry, document_content, file_type, content_hash = self._queue.get()
+            try:
+                if document_content is not None and self.documents_dir:
+                    entry.update(self._store_document(document_content, file_type))
+                    # Inline base64 documents are replaced by the stored copy
+                    payload = entry['payload']
+                    if isinstance(payload, dict) and str(payload.get('document', '')).startswith('data:'):
+                        entry['payload'] = dict(entry['payload'], document=None)
+                elif content_hash and self.documents_dir:
+                    # A revalidated (304) request has no body; its document is the one stored under that hash
+                    entry.update(self._existing_document(content_hash, file_type))
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(entry) + "\n")
+            except Exception:
+                self.dropped += 1
+            finally:
+                self._queue.task_done()
+    
+    def _store_document(self, content, file_type):
+        """Content-addressed copy, so repeated documents are stored once"""
+        digest = hashlib.sha256(content).hexdigest()
+        name = f"{digest}.{_EXTENSIONS.get(file_type, 'bin')}"
+        os.makedirs(self.documents_dir, exist_ok=True)
+        path = os.path.join(self.documents_dir, name)
+        if not os.path.exists(path):
+            with open(path + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(path + '.tmp', path)
+        return {'document_ref': name, 'document_bytes': len(content)}
+    
+    def _existing_document(self, content_hash, file_type):
+        """Reference a copy stored by an earlier capture; without one, replay falls back to the payload's URL"""
+        name = f"{content_hash}.{_EXTENSIONS.get(file_type, 'bin')}"
+        path = os.path.join(self.documents_dir, name)
+        if not os.path.exists(path):
+            return {'document_sha256': content_hash}
+        return {'document_ref': name, 'document_bytes': os.path.getsize(path)}
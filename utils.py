@@ -2,40 +2,168 @@ import requests
 import pytesseract
 from PIL import Image, ImageEnhance
 import io
+import os
 import pdf2image
 import re
+import threading
+import time
 import urllib3
 import base64
+import contextvars
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from config import Config
+from deadline import Deadline, DeadlineExceeded
+from layout import find_item_regions
+from page_hash import PageHashIndex
+from page_queue import create_page_queue, run_worker
+from structured_logging import get_logger, stage_timer, submit_in_context, current_request_id, start_request
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def download_file(url):
-    """Download file from URL or decode base64 data"""
+logger = get_logger('utils')
+
+# Tesseract threads for OCR started in this context; set by OCRScheduler.reserve and
+# inherited by page threads through submit_in_context
+_tesseract_threads = contextvars.ContextVar('tesseract_threads', default=None)
+_pytesseract_subprocess_args = pytesseract.pytesseract.subprocess_args
+
+def _subprocess_args_with_thread_limit(include_stdout=True):
+    """pytesseract's Popen arguments with this call's OMP_THREAD_LIMIT in a copy of the environment"""
+    kwargs = _pytesseract_subprocess_args(include_stdout)
+    threads = _tesseract_threads.get()
+    if threads is not None:
+        kwargs['env'] = dict(kwargs.get('env') or os.environ, OMP_THREAD_LIMIT=str(threads))
+    return kwargs
+
+# Every pytesseract call spawns through subprocess_args(), so the limit is per call, never process-wide
+pytesseract.pytesseract.subprocess_args = _subprocess_args_with_thread_limit
+
+class OCRScheduler:
+    """Split this worker's share of the cores between concurrent pages and Tesseract threads"""
+    
+    def __init__(self, cpu_count=None, worker_processes=None,
+                 max_page_concurrency=None, max_tesseract_threads=None):
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.worker_processes = max(1, worker_processes or Config.OCR_WORKER_PROCESSES)
+        self.max_page_concurrency = max_page_concurrency or Config.OCR_MAX_PAGE_CONCURRENCY
+        self.max_tesseract_threads = max_tesseract_threads or Config.OCR_MAX_TESSERACT_THREADS
+        self._reserved_cores = 0
+        self._lock = threading.Lock()
+    
+    def core_budget(self):
+        """Cores this worker may use now: its fair share, shrunk when the machine is overloaded"""
+        budget = self.cpu_count / self.worker_processes
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            load = 0
+        if load > self.cpu_count:
+            budget *= self.cpu_count / load
+        
+        budget = int(budget)
+        with self._lock:
+            budget -= self._reserved_cores
+        return max(1, min(budget, self.cpu_count))
+    
+    def plan(self, page_count):
+        """Decide page concurrency and threads per Tesseract run for one document"""
+        budget = self.core_budget()
+        
+        # Page-level parallelism scales better than Tesseract's OpenMP threads,
+        # so spend cores on pages first and give leftovers to each invocation
+        page_concurrency = max(1, min(page_count, budget, self.max_page_concurrency))
+        tesseract_threads = max(1, min(budget // page_concurrency, self.max_tesseract_threads))
+        
+        return {
+            'cpu_budget': budget,
+            'page_concurrency': page_concurrency,
+            'tesseract_threads': tesseract_threads
+        }
+    
+    @contextmanager
+    def reserve(self, plan):
+        """Hold the plan's cores so concurrent requests in this worker plan around them, and cap Tesseract's threads"""
+        cores = plan['page_concurrency'] * plan['tesseract_threads']
+        with self._lock:
+            self._reserved_cores += cores
+        previous = _tesseract_threads.get()
+        _tesseract_threads.set(plan['tesseract_threads'])
+        try:
+            yield plan
+        finally:
+            # set() rather than reset(): a streamed generator may be closed from another context
+            _tesseract_threads.set(previous)
+            with self._lock:
+                self._reserved_cores -= cores
+
+ocr_scheduler = OCRScheduler()
+
+def fetch_document(url, deadline=None, etag=None, last_modified=None):
+    """Download a document, revalidating with the given validators when present"""
     try:
-        print(f"🔗 Processing: {url[:100]}...")
+        if deadline and deadline.expired():
+            raise DeadlineExceeded("Request deadline expired before download")
+        
+        logger.debug("processing document", extra={'fields': {'url': url[:100]}})
         
         # Check if it's a base64 data URL
         if url.startswith('data:image'):
-            print("📸 Processing base64 image...")
-            return decode_base64_image(url)
+            with stage_timer(logger, 'decode'):
+                content = decode_base64_image(url)
+            return {
+                'content': content,
+                'not_modified': False,
+                'etag': None,
+                'last_modified': None
+            }
         
         # Regular URL
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
         
-        response = requests.get(url, timeout=30, headers=headers, verify=False)
+        timeout = deadline.timeout(30) if deadline else 30
+        with stage_timer(logger, 'download') as fields:
+            response = requests.get(url, timeout=timeout, headers=headers, verify=False)
+            fields.update(http_status=response.status_code, bytes=len(response.content))
+        
+        if response.status_code == 304 and (etag or last_modified):
+            return {
+                'content': None,
+                'not_modified': True,
+                'etag': response.headers.get('ETag', etag),
+                'last_modified': response.headers.get('Last-Modified', last_modified)
+            }
         
         if response.status_code != 200:
             raise Exception(f"HTTP {response.status_code}: {response.reason}")
         
-        print(f"✅ Downloaded {len(response.content)} bytes")
-        return response.content
+        return {
+            'content': response.content,
+            'not_modified': False,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        }
         
+    except DeadlineExceeded:
+        raise
     except Exception as e:
+        if deadline and deadline.expired():
+            raise DeadlineExceeded(f"Request deadline expired during download: {str(e)}")
         raise Exception(f"Download failed: {str(e)}")
 
+def download_file(url, deadline=None):
+    """Download file from URL or decode base64 data"""
+    return fetch_document(url, deadline)['content']
+
 def decode_base64_image(data_url):
     """Extract image from base64 data URL"""
     try:
@@ -44,9 +172,7 @@ def decode_base64_image(data_url):
         else:
             base64_data = data_url
             
-        image_data = base64.b64decode(base64_data)
-        print(f"✅ Decoded base64 image: {len(image_data)} bytes")
-        return image_data
+        return base64.b64decode(base64_data)
         
     except Exception as e:
         raise Exception(f"Base64 decoding failed: {str(e)}")
@@ -60,40 +186,298 @@ def preprocess_image(image):
         image = enhancer.enhance(2.0)
         return image
     except Exception as e:
-        print(f"Image preprocessing failed: {e}")
+        logger.warning("image preprocessing failed", extra={'fields': {'error': str(e)}})
         return image
 
-def extract_text_from_image(image_content):
-    """Extract text from image using OCR"""
+def _ocr_layout_regions(image, deadline=None, config=r'--oem 3 --psm 6'):
+    """OCR only the item and totals regions at full resolution, keeping word boxes"""
+    regions = find_item_regions(image)
+    if not regions:
+        return None
+    
+    words = []
+    lines = []
+    for left, top, right, bottom in regions:
+        data = pytesseract.image_to_data(
+            image.crop((left, top, right, bottom)), config=config,
+            output_type=pytesseract.Output.DICT, timeout=_stage_timeout(deadline)
+        )
+        
+        line_words = {}
+        for i, word in enumerate(data['text']):
+            if not word.strip():
+                continue
+            words.append({
+                'text': word,
+                'left': data['left'][i] + left,
+                'top': data['top'][i] + top,
+                'width': data['width'][i],
+                'height': data['height'][i],
+                'conf': float(data['conf'][i])
+            })
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            line_words.setdefault(key, []).append(word)
+        lines.extend(" ".join(line) for line in line_words.values())
+    
+    # Letterhead is only needed for page type keywords, so half resolution is enough
+    context_text = ''
+    header_bottom = regions[0][1]
+    if header_bottom > 0:
+        header = image.crop((0, 0, image.width, header_bottom)).reduce(2)
+        context_text = pytesseract.image_to_string(header, timeout=_stage_timeout(deadline))
+    
+    region_pixels = sum((right - left) * (bottom - top) for left, top, right, bottom in regions)
+    return {
+        'text': "\n".join(lines),
+        'context_text': context_text,
+        'words': words,
+        'layout': {
+            'regions': regions,
+            'ocr_pixel_ratio': round(region_pixels / (image.width * image.height), 3)
+        }
+    }
+
+# Tesseract reports the clockwise rotation that corrects the page
+_ROTATIONS = {
+    90: Image.Transpose.ROTATE_270,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_90
+}
+
+def detect_orientation(image, deadline=None):
+    """Cheap orientation and script detection on a downsampled copy of the page"""
+    scale = min(1.0, Config.OCR_OSD_MAX_SIDE / max(image.width, image.height))
+    small = image
+    if scale < 1.0:
+        small = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.BILINEAR)
+    
     try:
-        image = Image.open(io.BytesIO(image_content))
-        image = preprocess_image(image)
+        osd = pytesseract.image_to_osd(
+            small, output_type=pytesseract.Output.DICT, timeout=_stage_timeout(deadline)
+        )
+    except pytesseract.TesseractError:
+        # Too little text to decide; leave the page as it is
+        return {'rotation': 0, 'confidence': 0.0, 'script': None}
+    
+    rotation = osd.get('rotate', 0)
+    confidence = osd.get('orientation_conf', 0.0)
+    if confidence < Config.OCR_OSD_MIN_CONFIDENCE:
+        rotation = 0
+    return {'rotation': rotation, 'confidence': confidence, 'script': osd.get('script')}
+
+def ocr_page_image(image, deadline=None, layout_mode=False, config=''):
+    """OCR a decoded page, only its item regions when layout mode is on"""
+    image = preprocess_image(image)
+    
+    orientation = None
+    if Config.OCR_AUTO_ROTATE:
+        orientation = detect_orientation(image, deadline)
+        if orientation['rotation'] in _ROTATIONS:
+            image = image.transpose(_ROTATIONS[orientation['rotation']])
+    
+    page = None
+    if layout_mode:
+        page = _ocr_layout_regions(image, deadline)
+    
+    if page is None:
+        # No table found (or layout mode off): fall back to the whole page
+        text = pytesseract.image_to_string(image, config=config, timeout=_stage_timeout(deadline))
+        page = {'text': text}
+    
+    if orientation is not None:
+        page['orientation'] = orientation
+    return page
+
+def _budget_scale(width, height, max_pixels=None, min_short_side=None):
+    """Downscale factor that fits the pixel budget without dropping below OCR resolution"""
+    max_pixels = max_pixels or Config.OCR_MAX_PIXELS
+    min_short_side = min_short_side or Config.OCR_MIN_SHORT_SIDE
+    
+    if width * height <= max_pixels:
+        return 1.0
+    scale = (max_pixels / (width * height)) ** 0.5
+    scale = max(scale, min_short_side / min(width, height))
+    return min(1.0, scale)
+
+def open_image_within_budget(image_content, max_pixels=None, min_short_side=None):
+    """Decode an image at no more than the pixel budget"""
+    image = Image.open(io.BytesIO(image_content))
+    scale = _budget_scale(image.width, image.height, max_pixels, min_short_side)
+    if scale >= 1.0:
+        return image
+    
+    target = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    if image.format == 'JPEG':
+        # Let the decoder do the 1/2, 1/4 or 1/8 scaling (never below target) and gray conversion
+        image.draft('L', target)
+    
+    return _resize_to_target(image, target)
+
+def fit_pixel_budget(image, max_pixels=None, min_short_side=None):
+    """Downscale an already decoded image (e.g. a TIFF frame) to the pixel budget"""
+    scale = _budget_scale(image.width, image.height, max_pixels, min_short_side)
+    if scale >= 1.0:
+        return image
+    return _resize_to_target(image, (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+
+def _resize_to_target(image, target):
+    # A cheap integer box reduction first, then one small resize to the exact target
+    factor = min(image.width // target[0], image.height // target[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+    if image.size != target and image.width * image.height > target[0] * target[1]:
+        image = image.resize(target, Image.BILINEAR)
+    return image
+
+def ocr_image_content(image_content, deadline=None, layout_mode=False):
+    """Decode an image file and OCR it as a single page"""
+    try:
+        image = open_image_within_budget(image_content)
         
         custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(image, config=custom_config)
-        print(f"📝 OCR extracted: {len(text)} characters")
-        return text
+        with ocr_scheduler.reserve(ocr_scheduler.plan(1)), stage_timer(logger, 'ocr', page_no=1) as fields:
+            page = ocr_page_image(image, deadline, layout_mode, config=custom_config)
+            fields['chars'] = len(page['text'])
+        return page
     except Exception as e:
         raise Exception(f"OCR processing failed: {str(e)}")
 
-def extract_text_from_pdf(pdf_content):
-    """Extract text from PDF"""
+def extract_text_from_image(image_content, deadline=None):
+    """Extract text from image using OCR"""
+    return ocr_image_content(image_content, deadline)['text']
+
+def get_pdf_page_count(pdf_content):
+    """Read the page count from the PDF structure without rasterizing"""
     try:
-        images = pdf2image.convert_from_bytes(pdf_content, dpi=200)
-        pages_text = []
-        
-        for i, image in enumerate(images):
-            processed_image = preprocess_image(image)
-            text = pytesseract.image_to_string(processed_image)
-            pages_text.append({
-                'page_no': i + 1,
-                'text': text
-            })
+        return int(pdf2image.pdfinfo_from_bytes(pdf_content).get('Pages', 0))
+    except Exception as e:
+        raise Exception(f"PDF preflight failed: {str(e)}")
+
+def _stage_timeout(deadline):
+    """Timeout for an external tool call; 0 disables it in pdf2image/pytesseract"""
+    if deadline is None:
+        return 0
+    return max(deadline.timeout(), 0.1)
+
+def _ocr_deduplicated(image, page_no, page_index, deadline=None, layout_mode=False):
+    """OCR a page unless an earlier near-identical page already has text to reuse"""
+    if page_index is None:
+        return ocr_page_image(image, deadline, layout_mode)
+    
+    original, entry = page_index.claim(page_no, image)
+    if original is not None:
+        result = page_index.wait(original, deadline)
+        if result is not None:
+            return dict(result, duplicate_of=original['page_no'])
+        # The original failed or ran out of time, so OCR this copy after all
+        return ocr_page_image(image, deadline, layout_mode)
+    
+    result = None
+    try:
+        result = ocr_page_image(image, deadline, layout_mode)
+        return result
+    finally:
+        page_index.publish(entry, result)
+
+def _ocr_pdf_page(pdf_content, page_no, deadline=None, layout_mode=False, page_index=None):
+    """Rasterize and OCR a single PDF page"""
+    with stage_timer(logger, 'rasterize', page_no=page_no):
+        images = pdf2image.convert_from_bytes(
+            pdf_content, dpi=200, first_page=page_no, last_page=page_no,
+            timeout=_stage_timeout(deadline)
+        )
+    
+    results = []
+    for image in images:
+        with stage_timer(logger, 'ocr', page_no=page_no) as fields:
+            result = _ocr_deduplicated(image, page_no, page_index, deadline, layout_mode)
+            fields.update(chars=len(result['text']), duplicate_of=result.get('duplicate_of'))
+        results.append(result)
+    return results
+
+def iter_pdf_pages(pdf_content, deadline=None, scheduler=None, layout_mode=False, pages=None):
+    """Yield OCR text of each (selected) PDF page, in order, as soon as it is processed"""
+    scheduler = scheduler or ocr_scheduler
+    try:
+        if pages is None:
+            pages = list(range(1, get_pdf_page_count(pdf_content) + 1))
+        plan = scheduler.plan(len(pages))
+        concurrency = plan['page_concurrency']
+        page_index = PageHashIndex() if Config.PAGE_DEDUP_ENABLED else None
         
-        return pages_text
+        with scheduler.reserve(plan), ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = deque()
+            to_launch = deque(pages)
+            
+            while to_launch or pending:
+                # Keep the planned number of pages in flight
+                while to_launch and len(pending) < concurrency:
+                    # Stop launching new pages once the budget cannot fit another one
+                    if deadline and not deadline.can_start():
+                        deadline.mark_truncated('ocr')
+                        to_launch.clear()
+                        break
+                    page_no = to_launch.popleft()
+                    future = submit_in_context(
+                        executor, _ocr_pdf_page, pdf_content, page_no, deadline, layout_mode, page_index
+                    )
+                    pending.append((page_no, future))
+                
+                if not pending:
+                    break
+                
+                page_no, future = pending.popleft()
+                try:
+                    results = future.result()
+                except Exception:
+                    for _, queued in pending:
+                        queued.cancel()
+                    if deadline and deadline.expired():
+                        deadline.mark_truncated('rasterize/ocr')
+                        return
+                    raise
+                
+                for result in results:
+                    yield dict(result, page_no=page_no)
     except Exception as e:
         raise Exception(f"PDF processing failed: {str(e)}")
 
+def extract_text_from_pdf(pdf_content, deadline=None, layout_mode=False, pages=None):
+    """Extract text from PDF"""
+    return list(iter_pdf_pages(pdf_content, deadline, layout_mode=layout_mode, pages=pages))
+
+def iter_image_frames(image_content, deadline=None, layout_mode=False, pages=None):
+    """Yield OCR text of each (selected) frame of a TIFF/WebP, decoding one frame at a time"""
+    try:
+        image = Image.open(io.BytesIO(image_content))
+        if pages is None:
+            pages = list(range(1, getattr(image, 'n_frames', 1) + 1))
+        page_index = PageHashIndex() if Config.PAGE_DEDUP_ENABLED else None
+        
+        for page_no in pages:
+            if deadline and not deadline.can_start():
+                deadline.mark_truncated('ocr')
+                return
+            
+            # seek() only decodes the selected frame; the previous one can be freed
+            image.seek(page_no - 1)
+            frame = fit_pixel_budget(image.copy())
+            
+            try:
+                with ocr_scheduler.reserve(ocr_scheduler.plan(1)), \
+                        stage_timer(logger, 'ocr', page_no=page_no) as fields:
+                    page = _ocr_deduplicated(frame, page_no, page_index, deadline, layout_mode)
+                    fields.update(chars=len(page['text']), duplicate_of=page.get('duplicate_of'))
+            except Exception:
+                if deadline and deadline.expired():
+                    deadline.mark_truncated('ocr')
+                    return
+                raise
+            
+            yield dict(page, page_no=page_no)
+    except Exception as e:
+        raise Exception(f"Image frame processing failed: {str(e)}")
+
 def detect_file_type(content):
     """Detect file type from content"""
     if content.startswith(b'%PDF'):
@@ -102,18 +486,168 @@ def detect_file_type(content):
         return 'jpg'
     elif content.startswith(b'\x89PNG'):
         return 'png'
+    elif content.startswith(b'II*\x00') or content.startswith(b'MM\x00*'):
+        return 'tiff'
+    elif content.startswith(b'RIFF') and content[8:12] == b'WEBP':
+        return 'webp'
     else:
         return 'unknown'
 
-def extract_text_from_document(document_content):
-    """Extract text from document based on file type"""
-    file_type = detect_file_type(document_content)
-    print(f"🔍 Detected file type: {file_type}")
+def process_page_task(task):
+    """Worker side of the page queue: OCR one page of a published document"""
+    options = task['options']
+    # Logs from this worker carry the id of the request that published the page
+    start_request(options.get('request_id'))
+    layout_mode = options.get('layout_mode', False)
+    deadline = None
+    if options.get('expires_at'):
+        deadline = Deadline(options['expires_at'] - time.time())
+        if deadline.expired():
+            raise DeadlineExceeded("Request deadline expired before the page was claimed")
     
+    content = task['content']
+    page_no = task['page_no']
+    if task['file_type'] == 'pdf':
+        return _ocr_pdf_page(content, page_no, deadline, layout_mode)
+    if task['file_type'] in ['tiff', 'webp']:
+        image = Image.open(io.BytesIO(content))
+        image.seek(page_no - 1)
+        return [ocr_page_image(fit_pixel_budget(image.copy()), deadline, layout_mode)]
+    return [ocr_image_content(content, deadline, layout_mode)]
+
+_page_queue = None
+_page_queue_lock = threading.Lock()
+
+def get_page_queue():
+    """Queue from PAGE_QUEUE_URL, with PAGE_QUEUE_LOCAL_WORKERS in-process workers started once"""
+    global _page_queue
+    with _page_queue_lock:
+        if _page_queue is None:
+            _page_queue = create_page_queue(Config.PAGE_QUEUE_URL)
+            for _ in range(Config.PAGE_QUEUE_LOCAL_WORKERS):
+                threading.Thread(
+                    target=run_worker, args=(_page_queue, process_page_task), daemon=True
+                ).start()
+        return _page_queue
+
+def iter_queued_pages(document_content, file_type, pages, deadline=None, layout_mode=False, queue=None):
+    """Publish one OCR task per page and gather the results back in page order"""
+    queue = queue or get_page_queue()
+    options = {'layout_mode': layout_mode, 'request_id': current_request_id()}
+    if deadline:
+        options['expires_at'] = time.time() + deadline.remaining()
+    
+    job_id = queue.submit_job(document_content, file_type, pages, options)
+    try:
+        for page_no in pages:
+            outcome = queue.wait_for_page(job_id, page_no, deadline.remaining() if deadline else None)
+            if outcome is None:
+                deadline.mark_truncated('ocr')
+                return
+            if outcome['status'] == 'failed':
+                if deadline and deadline.expired():
+                    deadline.mark_truncated('ocr')
+                    return
+                raise Exception(f"OCR of page {page_no} failed: {outcome['error']}")
+            
+            for result in outcome['result']:
+                yield dict(result, page_no=page_no)
+    finally:
+        # Also drops tasks nobody claimed yet once the caller stops listening
+        queue.delete_job(job_id)
+
+class PageSelectionError(ValueError):
+    """Raised for a malformed or out-of-range 'pages' selection"""
+
+def get_document_page_count(document_content, file_type=None):
+    """Page or frame count from the file structure, without rasterizing"""
+    file_type = file_type or detect_file_type(document_content)
     if file_type == 'pdf':
-        return extract_text_from_pdf(document_content)
+        return get_pdf_page_count(document_content)
+    if file_type in ['tiff', 'webp']:
+        return getattr(Image.open(io.BytesIO(document_content)), 'n_frames', 1)
+    return 1
+
+def parse_page_selection(selection, page_count):
+    """Turn "1-3,7", "5-" or [1, "4-6"] into sorted page numbers; None means all pages"""
+    if selection is None or selection == '' or selection == []:
+        return None
+    
+    if isinstance(selection, (str, int)) and not isinstance(selection, bool):
+        parts = str(selection).split(',')
+    elif isinstance(selection, list):
+        parts = selection
+    else:
+        raise PageSelectionError(f"Invalid page selection: {selection!r}")
+    
+    selected = set()
+    for part in parts:
+        if isinstance(part, bool):
+            raise PageSelectionError(f"Invalid page selection: {part!r}")
+        match = re.fullmatch(r'\s*(\d+)\s*(?:(-)\s*(\d*)\s*)?', str(part))
+        if not match:
+            raise PageSelectionError(f"Invalid page selection: {part!r}")
+        
+        start = int(match.group(1))
+        if match.group(3):
+            end = int(match.group(3))
+        else:
+            # "5-" runs to the last page
+            end = page_count if match.group(2) else start
+        if start < 1 or end < start:
+            raise PageSelectionError(f"Invalid page range: {part!r}")
+        selected.update(range(start, min(end, page_count) + 1))
+    
+    if not selected:
+        raise PageSelectionError(f"Page selection {selection!r} is outside the document's {page_count} pages")
+    return sorted(selected)
+
+def iter_document_pages(document_content, deadline=None, layout_mode=False, pages=None):
+    """Yield extracted text page by page based on file type"""
+    file_type = detect_file_type(document_content)
+    logger.info("file type detected", extra={'fields': {'file_type': file_type}, 'sampled': True})
+    
+    if Config.PAGE_QUEUE_URL and file_type in ['pdf', 'jpg', 'png', 'jpeg', 'tiff', 'webp']:
+        if pages is None:
+            pages = list(range(1, get_document_page_count(document_content, file_type) + 1))
+        yield from iter_queued_pages(document_content, file_type, pages, deadline, layout_mode)
+    elif file_type == 'pdf':
+        yield from iter_pdf_pages(document_content, deadline, layout_mode=layout_mode, pages=pages)
     elif file_type in ['jpg', 'png', 'jpeg']:
-        text = extract_text_from_image(document_content)
-        return [{'page_no': 1, 'text': text}]
+        try:
+            page = ocr_image_content(document_content, deadline, layout_mode)
+        except Exception:
+            if deadline and deadline.expired():
+                deadline.mark_truncated('ocr')
+                return
+            raise
+        yield dict(page, page_no=1)
+    elif file_type in ['tiff', 'webp']:
+        yield from iter_image_frames(document_content, deadline, layout_mode, pages)
     else:
-        raise Exception(f"Unsupported file format: {file_type}")
\ No newline at end of file
+        raise Exception(f"Unsupported file format: {file_type}")
+
+def extract_text_from_document(document_content, deadline=None, layout_mode=False, pages=None):
+    """Extract text from document based on file type"""
+    return list(iter_document_pages(document_content, deadline, layout_mode, pages))
+
+
+@functools.lru_cache(maxsize=1)
+def _tesseract_version():
+    try:
+        return str(pytesseract.get_tesseract_version())
+    except Exception:
+        return None
+
+def ocr_settings(layout_mode=False, pages=None):
+    """Everything that shapes the OCR text, stored alongside it for later re-parsing"""
+    return {
+        'tesseract': _tesseract_version(),
+        'pdf_dpi': 200,
+        'layout_mode': bool(layout_mode),
+        'pages': pages,
+        'auto_rotate': Config.OCR_AUTO_ROTATE,
+        'max_pixels': Config.OCR_MAX_PIXELS,
+        'min_short_side': Config.OCR_MIN_SHORT_SIDE,
+        'page_dedup': Config.PAGE_DEDUP_ENABLED
+    }
\ No newline at end of file